@@ -0,0 +1,83 @@
+import io
+import shutil
+import subprocess
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from functions import wav_from_buffers
+from tracing import span
+
+try:
+    import soundfile as sf
+except (ImportError, OSError):  # Нет пакета или libsndfile
+    sf = None
+
+OPUS_BITRATE = 24000  # Битрейт Opus по умолчанию (бит/с), для речи хватает 16-32 кбит/с
+
+# filename - имя файла для загрузки (расширение определяет формат для Whisper),
+# raw_bytes - размер несжатого PCM, seconds - время кодирования
+EncodedAudio = namedtuple('EncodedAudio', ['filename', 'data', 'raw_bytes', 'seconds'])
+
+_unavailable = set()  # Кодеки, о недоступности которых уже предупредили
+
+
+def _encode_flac(buffers, sample_rate, channels):
+    if sf is None:
+        return None
+    samples = np.concatenate(buffers)
+    if channels > 1:
+        samples = samples.reshape(-1, channels)
+    with io.BytesIO() as f:
+        sf.write(f, samples, sample_rate, format='FLAC', subtype='PCM_16')
+        return f.getvalue()
+
+
+def _encode_opus(buffers, sample_rate, channels, bitrate):
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return None
+    pcm = b"".join(np.ascontiguousarray(buf).tobytes() for buf in buffers)
+    process = subprocess.run(
+        [ffmpeg, "-hide_banner", "-loglevel", "error",
+         "-f", "s16le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0",
+         "-c:a", "libopus", "-b:a", str(bitrate), "-application", "voip",
+         "-f", "ogg", "pipe:1"],
+        input=pcm, capture_output=True, check=True
+    )
+    return process.stdout
+
+
+def encode_audio(buffers, sample_rate, name, fmt="wav", bitrate=OPUS_BITRATE, channels=1):
+    """Кодирует массивы int16 для загрузки в Whisper.
+    fmt: "wav" (без сжатия), "flac" (без потерь) или "opus" (OGG/Opus с битрейтом bitrate).
+    Если кодек недоступен, возвращает WAV"""
+    with span("encode_audio", format=fmt) as s:
+        encoded = _encode(buffers, sample_rate, name, fmt, bitrate, channels)
+        s.set(format=encoded.filename.rsplit(".", 1)[-1], bytes=len(encoded.data), raw_bytes=encoded.raw_bytes)
+    return encoded
+
+
+def _encode(buffers, sample_rate, name, fmt, bitrate, channels):
+    start = time.perf_counter()
+    raw_bytes = sum(buf.nbytes for buf in buffers)
+    data = None
+    try:
+        if fmt == "flac":
+            data = _encode_flac(buffers, sample_rate, channels)
+            ext = "flac"
+        elif fmt == "opus":
+            data = _encode_opus(buffers, sample_rate, channels, bitrate)
+            ext = "ogg"
+    except Exception as e:
+        print(f"Ошибка кодирования в {fmt}: {str(e)}")
+        data = None
+
+    if data is None:
+        if fmt != "wav" and fmt not in _unavailable:
+            _unavailable.add(fmt)
+            print(f"Кодек {fmt} недоступен, отправляем WAV")
+        data = bytes(wav_from_buffers(buffers, sample_rate, channels))
+        ext = "wav"
+    return EncodedAudio(f"{name}.{ext}", data, raw_bytes, time.perf_counter() - start)
@@ -1,33 +1,79 @@
-import sounddevice as sd
 import numpy as np
 import wave
 import io
+import math
+import time
+from collections import namedtuple
+
+from ring_buffer import RingBuffer
+
+BUFFER_SECONDS = 60  # Емкость кольцевого буфера (секунд аудио)
+ENVELOPE_ATTACK = 0.01  # Постоянная времени нарастания огибающей (секунды)
+ENVELOPE_RELEASE = 0.1  # Постоянная времени спада огибающей (секунды)
+CLIP_LEVEL = 0.99  # Пик, начиная с которого считаем, что сигнал перегружен
+CLIP_HOLD = 1.0  # Сколько секунд держать флаг перегрузки после последнего пика
+SILENCE_LEVEL = 0.002  # Уровень огибающей, ниже которого считаем тишину
+
+
+class AudioLevel(namedtuple('AudioLevel', ['rms', 'peak', 'envelope', 'clipped'])):
+    """Снимок статистики уровня звука (значения в диапазоне 0..1)"""
+    __slots__ = ()
+
+    def is_silent(self, threshold=SILENCE_LEVEL):
+        """Тишина по огибающей"""
+        return self.envelope < threshold
+
+
+SILENT_LEVEL = AudioLevel(0.0, 0.0, 0.0, False)
+
 
 class AudioRecorder:
-    def __init__(self):
+    def __init__(self, buffer_seconds=BUFFER_SECONDS):
         self.sample_rate = 16000
         self.channels = 1
         self.is_recording = False
-        self.audio_buffer = []
-        
+        # Буфер выделяется один раз: память не растет, сколько бы ни шла запись
+        self.audio_buffer = RingBuffer(self.sample_rate * self.channels * buffer_seconds)
+        self.overflow_samples = 0  # Сколько сэмплов потеряно за сессию
+        # Статистика уровня считается в callback и публикуется одним присваиванием
+        self.level = SILENT_LEVEL
+        self.clipped_blocks = 0  # Сколько блоков с перегрузкой за сессию
+        self._clip_hold = 0  # Сколько сэмплов еще держать флаг перегрузки
+
+    def reset(self):
+        """Сбрасывает буфер и статистику перед новой записью"""
+        self.audio_buffer.clear()
+        self.overflow_samples = 0
+        self.level = SILENT_LEVEL
+        self.clipped_blocks = 0
+        self._clip_hold = 0
+
+    def on_block(self, indata):
+        """Принимает очередной блок сэмплов от источника звука"""
+        self.audio_buffer.write(indata)
+        self.update_level(indata)
+
     def start_recording(self):
         """Начинает запись аудио"""
         self.is_recording = True
-        self.audio_buffer = []
-        
+        self.reset()
+
         def callback(indata, frames, time, status):
             if status:
                 print(f"Ошибка записи: {status}")
             if self.is_recording:
-                self.audio_buffer.extend(indata.copy())
-        
+                self.on_block(indata)
+
+        # Импорт здесь: без звуковой карты (бенчмарк, сервер) модуль остается рабочим
+        import sounddevice as sd
         self.stream = sd.InputStream(
             channels=self.channels,
             samplerate=self.sample_rate,
+            dtype='int16',
             callback=callback
         )
         self.stream.start()
-        
+
     def stop_recording(self):
         """Останавливает запись аудио"""
         if self.is_recording:
@@ -35,27 +81,75 @@ class AudioRecorder:
             if hasattr(self, 'stream'):
                 self.stream.stop()
                 self.stream.close()
-                
+
+    def update_level(self, indata):
+        """Обновляет статистику уровня по очередному блоку сэмплов (вызывается из callback)"""
+        block = indata.reshape(-1).astype(np.float32) / 32768
+        frames = len(block)
+        if not frames:
+            return
+        mean_abs = float(np.abs(block).mean())
+        rms = math.sqrt(float(np.dot(block, block)) / frames)
+        peak = float(np.abs(block).max())
+
+        # Огибающая: быстрое нарастание и медленный спад
+        envelope = self.level.envelope
+        tau = ENVELOPE_ATTACK if mean_abs > envelope else ENVELOPE_RELEASE
+        alpha = 1 - math.exp(-frames / (self.sample_rate * self.channels * tau))
+        envelope += alpha * (mean_abs - envelope)
+
+        if peak >= CLIP_LEVEL:
+            self.clipped_blocks += 1
+            self._clip_hold = int(self.sample_rate * self.channels * CLIP_HOLD)
+        else:
+            self._clip_hold = max(self._clip_hold - frames, 0)
+
+        # Присваивание кортежа атомарно: читатели всегда видят целостный снимок
+        self.level = AudioLevel(rms, peak, envelope, self._clip_hold > 0)
+
+    def clock(self):
+        """Время записи для планировщика чанков (у записи с микрофона - обычное монотонное)"""
+        return time.monotonic()
+
+    def to_monotonic(self, t):
+        """Переводит время clock() в time.monotonic()"""
+        return t
+
+    def get_level_snapshot(self):
+        """Возвращает последний снимок статистики уровня (AudioLevel)"""
+        return self.level
+
     def get_audio_level(self):
         """Возвращает текущий уровень звука для визуализации"""
-        if not self.audio_buffer:
-            return 0
-        recent_samples = self.audio_buffer[-1000:] if len(self.audio_buffer) > 1000 else self.audio_buffer
-        return float(np.abs(recent_samples).mean())
-        
-    def save_chunk(self):
-        """Сохраняет текущий чанк аудио и очищает буфер"""
-        if not self.audio_buffer:
+        return self.level.envelope
+
+    def read_chunk(self):
+        """Забирает накопленные сэмплы (int16) из буфера"""
+        audio_data = self.audio_buffer.read()
+
+        # Сообщаем о переполнении вместо неограниченного роста буфера
+        lost = self.audio_buffer.overflow_count - self.overflow_samples
+        if lost > 0:
+            self.overflow_samples = self.audio_buffer.overflow_count
+            print(f"Переполнение аудио буфера: потеряно {lost / self.sample_rate:.2f} с")
+
+        if not len(audio_data):
             return None
-            
-        audio_data = np.array(self.audio_buffer, dtype=np.float32)
-        audio_data = (audio_data * 32767).astype(np.int16)
-        self.audio_buffer = []
-        
+        return audio_data
+
+    def to_wav(self, audio_data):
+        """Кодирует сэмплы int16 в WAV"""
         with io.BytesIO() as wav_buffer:
             with wave.open(wav_buffer, 'wb') as wav_file:
                 wav_file.setnchannels(self.channels)
                 wav_file.setsampwidth(2)
                 wav_file.setframerate(self.sample_rate)
                 wav_file.writeframes(audio_data.tobytes())
-            return wav_buffer.getvalue() 
\ No newline at end of file
+            return wav_buffer.getvalue()
+
+    def save_chunk(self):
+        """Сохраняет текущий чанк аудио и очищает буфер"""
+        audio_data = self.read_chunk()
+        if audio_data is None:
+            return None
+        return self.to_wav(audio_data)
@@ -7,7 +7,7 @@ from functions import *
 wav_file = "temp/combined.wav"
     
 # Получаем расшифровку
-result = audio_to_text(wav_file, api_key)
+result = audio_to_text(wav_file)
 
 print(result)
     
@@ -0,0 +1,295 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from chunk_manifest import get_manifest
+from session_audio import SessionAudio
+from audio_encoder import encode_audio
+from transcription import create_engine
+from llm import LLMRouter, PROVIDERS
+from functions import (read_wav, improve_text_prompt, answer_prompt, combined_prompt, split_combined,
+                       TEXT_MARKER, ANSWER_MARKER)
+
+AUDIO_DIR = os.path.join("logs", "audio")
+TEXT_DIR = os.path.join("logs", "text")
+WINDOW_SECONDS = 70  # Длительность окна, как в main.py: подсказка строится по окну, а не по всему чату
+WORKERS = 16  # Окон в работе одновременно: почти все время уходит на ожидание API
+UPLOAD_FORMAT = "flac"
+# Лимиты запросов в минуту для каждого API (переопределяются --rpm)
+RATE_LIMITS = {"whisper": 50, "gpt": 500, "claude": 50, "grok": 60}
+
+# Встроенные варианты промптов: (улучшение текста, подсказка) или один комбинированный
+VARIANTS = {
+    "serial": (improve_text_prompt, answer_prompt),
+    "merged": (combined_prompt,),
+}
+
+
+class RateLimiter:
+    """Не больше rpm запросов в минуту: равномерные интервалы, общие для всех потоков"""
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            wait = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ResultFile:
+    """Дописываемый JSONL с результатами по окнам: по нему продолжается прерванный прогон.
+    Недописанная последняя строка (после аварийного завершения) пропускается"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.results = {}  # Номер окна -> запись
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.results[record["window"]] = record
+
+    def get(self, window):
+        with self.lock:
+            return self.results.get(window)
+
+    def add(self, record):
+        with self.lock:
+            self.results[record["window"]] = record
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def parse_chats(spec):
+    """"1-10,15" -> [1, ..., 10, 15]; "all" - все чаты в logs/audio"""
+    if spec == "all":
+        return sorted(int(d.split('_')[1]) for d in os.listdir(AUDIO_DIR)
+                      if d.startswith('chat_') and d.split('_')[1].isdigit())
+    chats = []
+    for part in spec.split(","):
+        first, _, last = part.strip().partition("-")
+        chats.extend(range(int(first), int(last or first) + 1))
+    return chats
+
+
+def load_variant(spec):
+    """name или name=file. Файл с разделами TEXT_MARKER и ANSWER_MARKER - комбинированный промпт,
+    иначе - промпт подсказки (текст улучшается стандартным improve_text_prompt)"""
+    name, _, path = spec.partition("=")
+    if not path:
+        if name not in VARIANTS:
+            raise argparse.ArgumentTypeError(f"неизвестный вариант {name}, встроенные: {', '.join(VARIANTS)}")
+        return name, VARIANTS[name]
+    if not re.fullmatch(r"[\w.-]+", name):
+        raise argparse.ArgumentTypeError(f"имя варианта {name} пойдет в имя файла: только буквы, цифры, . и -")
+    with open(path, encoding="utf-8") as f:
+        prompt = f.read()
+    if "[[TEXT]]" not in prompt:
+        raise argparse.ArgumentTypeError(f"{path}: в промпте нет [[TEXT]]")
+    if TEXT_MARKER in prompt and ANSWER_MARKER in prompt:
+        return name, (prompt,)
+    return name, (improve_text_prompt, prompt)
+
+
+def chat_windows(manifest, window_seconds):
+    """Делит чанки чата на окна подряд идущих чанков не длиннее window_seconds"""
+    windows, current, duration = [], [], 0.0
+    for entry in manifest.slice():
+        if current and duration + entry.duration > window_seconds:
+            windows.append(current)
+            current, duration = [], 0.0
+        current.append(entry)
+        duration += entry.duration
+    if current:
+        windows.append(current)
+    return windows
+
+
+class BatchRunner:
+    """Повторная обработка записанных чатов: распознавание окон и подсказки по вариантам промптов.
+
+    Единица работы - окно чата. Окна всех чатов идут через общий пул потоков, запросы
+    к каждому API ограничены RateLimiter. Результаты пишутся в logs/text/chat_N_batch/:
+    transcript_<движок>.jsonl и <вариант>_<провайдер>.jsonl. Готовые окна при повторном
+    запуске пропускаются.
+    """
+
+    def __init__(self, variants, engine="openai", provider="gpt", window_seconds=WINDOW_SECONDS,
+                 workers=WORKERS, rate_limits=None, force=False):
+        self.variants = variants
+        self.engine_name = engine
+        self.engine = create_engine(engine)
+        self.provider = provider
+        self.window_seconds = window_seconds
+        self.workers = workers
+        self.force = force
+        limits = dict(RATE_LIMITS, **(rate_limits or {}))
+        self.limiters = {name: RateLimiter(rpm) for name, rpm in limits.items()}
+        # Локальная модель - один процесс, запросы к ней по одному
+        self.whisper_slots = threading.Semaphore(1 if self.engine.name == "local" else workers)
+        self.router = LLMRouter({provider: workers})
+        self.stats = {"done": 0, "skipped": 0, "errors": 0}
+        self.stats_lock = threading.Lock()
+
+    def count(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def result_files(self, chat_id):
+        out_dir = os.path.join(TEXT_DIR, f"chat_{chat_id}_batch")
+        os.makedirs(out_dir, exist_ok=True)
+        transcripts = ResultFile(os.path.join(out_dir, f"transcript_{self.engine_name}.jsonl"))
+        answers = {name: ResultFile(os.path.join(out_dir, f"{name}_{self.provider}.jsonl"))
+                   for name in self.variants}
+        return transcripts, answers
+
+    def read_window(self, manifest, session, window):
+        if session is not None:
+            return [session.read_entries(window)], session.sample_rate
+        buffers, sample_rate = [], None
+        for entry in window:
+            with open(manifest.chunk_path(entry.num), "rb") as f:
+                samples, sample_rate = read_wav(f.read())
+            buffers.append(samples)
+        return buffers, sample_rate
+
+    def transcribe(self, chat_id, index, window, buffers, sample_rate):
+        encoded = encode_audio(buffers, sample_rate, f"chat_{chat_id}_window_{index}", UPLOAD_FORMAT)
+        duration = sum(entry.duration for entry in window)
+        with self.whisper_slots:
+            if self.engine.name == "openai":
+                self.limiters["whisper"].acquire()
+            result = self.engine.transcribe((encoded.filename, encoded.data), duration)
+        if result is None:
+            return None
+        return {"window": index, "chunks": [window[0].num, window[-1].num], "start": window[0].start,
+                "duration": round(duration, 3), "text": result.text.strip()}
+
+    def ask(self, prompt, text):
+        self.limiters[self.provider].acquire()
+        usage = []
+        start = time.perf_counter()
+        answer, _ = self.router.ask_async(prompt.replace("[[TEXT]]", text), (self.provider,),
+                                          on_usage=usage.append).result()
+        return answer, time.perf_counter() - start, usage
+
+    def answer(self, prompts, raw_text):
+        """Прогоняет текст окна через вариант промптов, возвращает поля записи"""
+        seconds, input_tokens, output_tokens = 0.0, 0, 0
+        if len(prompts) == 1:
+            output, seconds, usage = self.ask(prompts[0], raw_text)
+            text, answer = split_combined(output)
+        else:
+            text, seconds, usage = self.ask(prompts[0], raw_text)
+            answer, answer_seconds, answer_usage = self.ask(prompts[1], text)
+            seconds += answer_seconds
+            usage += answer_usage
+        for item in usage:
+            input_tokens += item.input_tokens
+            output_tokens += item.output_tokens
+        return {"text": text, "answer": answer, "llm_ms": round(seconds * 1000, 1),
+                "input_tokens": input_tokens, "output_tokens": output_tokens}
+
+    def process_window(self, chat_id, manifest, session, index, window, transcripts, answers):
+        """Одно окно: распознавание (если его еще нет) и подсказки по всем вариантам"""
+        label = f"chat_{chat_id} окно {index + 1}"
+        transcript = None if self.force else transcripts.get(index)
+        pending = [name for name in self.variants if self.force or answers[name].get(index) is None]
+        if transcript is not None and not pending:
+            self.count("skipped")
+            return
+        try:
+            if transcript is None:
+                buffers, sample_rate = self.read_window(manifest, session, window)
+                transcript = self.transcribe(chat_id, index, window, buffers, sample_rate)
+                if transcript is None:
+                    raise RuntimeError("не удалось распознать аудио")
+                transcripts.add(transcript)
+            for name in pending:
+                if not transcript["text"]:
+                    fields = {"text": "", "answer": None}
+                else:
+                    fields = self.answer(self.variants[name], transcript["text"])
+                answers[name].add({"window": index, "chunks": transcript["chunks"], **fields})
+            self.count("done")
+        except Exception as e:
+            print(f"Ошибка обработки ({label}): {str(e)}")
+            self.count("errors")
+
+    def run(self, chats):
+        start = time.perf_counter()
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as pool:
+            for chat_id in chats:
+                chat_dir = os.path.join(AUDIO_DIR, f"chat_{chat_id}")
+                if not os.path.isdir(chat_dir):
+                    print(f"Нет директории {chat_dir}, пропускаем")
+                    continue
+                manifest = get_manifest(chat_dir)
+                session = SessionAudio(chat_dir) if SessionAudio.exists(chat_dir) else None
+                transcripts, answers = self.result_files(chat_id)
+                for index, window in enumerate(chat_windows(manifest, self.window_seconds)):
+                    futures.append(pool.submit(self.process_window, chat_id, manifest, session,
+                                               index, window, transcripts, answers))
+            for completed, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if completed % 10 == 0 or completed == len(futures):
+                    print(f"Окон обработано: {completed}/{len(futures)}")
+        self.engine.stop()
+        self.stats["seconds"] = round(time.perf_counter() - start, 1)
+        return self.stats
+
+
+def parse_rpm(values):
+    """api=запросов в минуту, например gpt=300"""
+    limits = {}
+    for value in values or []:
+        api, _, rpm = value.partition("=")
+        if api not in RATE_LIMITS:
+            raise argparse.ArgumentTypeError(f"неизвестный API {api}, доступны: {', '.join(RATE_LIMITS)}")
+        limits[api] = float(rpm)
+    return limits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Повторное распознавание и подсказки для записанных чатов")
+    parser.add_argument("chats", help='Номера чатов: "1-10,15" или "all"')
+    parser.add_argument("--variant", action="append", metavar="NAME[=FILE]",
+                        help=f"Вариант промптов: встроенный ({', '.join(VARIANTS)}) или файл с [[TEXT]]")
+    parser.add_argument("--engine", default="openai", help='Движок распознавания: "openai" или "local"')
+    parser.add_argument("--provider", default="gpt", choices=list(PROVIDERS), help="Провайдер LLM")
+    parser.add_argument("--window", type=float, default=WINDOW_SECONDS, help="Длительность окна (секунды)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Окон в работе одновременно")
+    parser.add_argument("--rpm", action="append", metavar="API=N",
+                        help=f"Лимит запросов в минуту, API: {', '.join(RATE_LIMITS)}")
+    parser.add_argument("--force", action="store_true", help="Пересчитать и уже готовые окна")
+    args = parser.parse_args()
+
+    variants = dict(load_variant(spec) for spec in args.variant or ["serial"])
+    runner = BatchRunner(variants, args.engine, args.provider, args.window, args.workers,
+                         parse_rpm(args.rpm), args.force)
+    stats = runner.run(parse_chats(args.chats))
+    print(f"Готово за {stats['seconds']} с: обработано {stats['done']}, пропущено {stats['skipped']}, "
+          f"ошибок {stats['errors']}")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+# command to run: python src/batch.py 1-20 --variant serial --variant new=prompts/answer.txt --provider gpt
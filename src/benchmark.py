@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import glob
+import time
+import wave
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+from audio_recorder import AudioRecorder
+from mock_api import MockAPI, DEFAULT_LATENCY, DEFAULT_TRANSCRIPT
+
+BLOCK_MS = 20  # Размер блока, которым «микрофон» отдает сэмплы
+QUIET_SECONDS = 3.0  # После конца записи ждем, пока конвейер столько времени ничего не присылает
+MAX_TAIL_SECONDS = 60.0  # Но не дольше
+
+# События лога (см. ChatProcessor) -> метрика отчета
+STAGE_EVENTS = {
+    "Кодирование": "encode",
+    "Распознавание": "transcribe",
+    "Текст улучшен": "clean",
+    "Латентность LLM": "llm",
+    "Задержка подсказки": "end_to_end",
+}
+
+
+def read_samples(path, sample_rate):
+    """Читает WAV в моно int16 с частотой sample_rate"""
+    with wave.open(path, "rb") as w:
+        if w.getsampwidth() != 2:
+            raise ValueError(f"{path}: нужен 16-битный WAV")
+        samples = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+        channels, rate = w.getnchannels(), w.getframerate()
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if rate != sample_rate:
+        positions = np.arange(0, len(samples), rate / sample_rate)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.int16)
+    return samples
+
+
+class FileRecorder(AudioRecorder):
+    """Отдает записанные WAV через интерфейс AudioRecorder вместо микрофона.
+
+    Сэмплы идут блоками в реальном времени или быстрее (speed). clock() - время
+    записи, поэтому паузы планировщик видит такими, какие они в записи, при любой скорости.
+    """
+
+    def __init__(self, paths, speed=1.0):
+        super().__init__()
+        self.samples = np.concatenate([read_samples(path, self.sample_rate) for path in paths])
+        self.speed = speed
+        self.position = 0  # Сколько сэмплов уже отдано
+        self.started = None
+        self.finished = threading.Event()
+        self.player = None
+
+    def start_recording(self):
+        self.is_recording = True
+        self.reset()
+        self.position = 0
+        self.finished.clear()
+        self.started = time.monotonic()
+        self.player = threading.Thread(target=self._play, name="file-recorder", daemon=True)
+        self.player.start()
+
+    def _play(self):
+        block = self.sample_rate * BLOCK_MS // 1000
+        for start in range(0, len(self.samples), block):
+            delay = self.to_monotonic(start / self.sample_rate) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if not self.is_recording:
+                break
+            chunk = self.samples[start:start + block]
+            self.on_block(chunk.reshape(-1, 1))
+            self.position = start + len(chunk)
+        self.finished.set()
+
+    def stop_recording(self):
+        self.is_recording = False
+        if self.player is not None:
+            self.player.join()
+
+    def clock(self):
+        return self.position / self.sample_rate
+
+    def to_monotonic(self, t):
+        return self.started + t / self.speed
+
+    @property
+    def duration(self):
+        return len(self.samples) / self.sample_rate
+
+
+def percentiles(values):
+    values = np.asarray(values, dtype=float)
+    return {"n": len(values), "p50": float(np.percentile(values, 50)), "p95": float(np.percentile(values, 95)),
+            "mean": float(values.mean())}
+
+
+def collect(log_dir):
+    """Собирает длительности стадий из JSONL логов прогона"""
+    stages = {name: [] for name in STAGE_EVENTS.values()}
+    rtf = []
+    for path in glob.glob(os.path.join(log_dir, "*_log.jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                stage = STAGE_EVENTS.get(record.get("event"))
+                if stage is not None and "duration_ms" in record:
+                    stages[stage].append(record["duration_ms"])
+                if record.get("rtf") is not None:
+                    rtf.append(record["rtf"])
+    report = {stage: percentiles(values) for stage, values in stages.items() if values}
+    if rtf:
+        report["rtf"] = percentiles(rtf)
+    return report
+
+
+def run(wavs, speed=1.0, latency=None, transcript=DEFAULT_TRANSCRIPT, seed=0, settings=None, trace=None):
+    """Один прогон: записи через MainWindow и ChatProcessor против локального MockAPI.
+    settings - переопределения конфигурации main.py (PIPELINE_MODE, LLM_PROVIDERS, ...),
+    trace - куда сохранить Chrome trace прогона"""
+    mock = MockAPI(latency, transcript=transcript, seed=seed).start()
+    os.environ.update({
+        "OPENAI_API_KEY": "mock", "OPENAI_BASE_URL": f"{mock.url}/v1",
+        "CLAUDE_API_KEY": "mock", "CLAUDE_MODEL": "mock", "ANTHROPIC_BASE_URL": mock.url,
+        "GROK_API_KEY": "mock", "GROK_BASE_URL": f"{mock.url}/v1",
+    })
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    workdir = os.getcwd()
+    os.chdir(tempfile.mkdtemp(prefix="benchmark_"))  # Логи прогона не смешиваются с настоящими
+    try:
+        from PyQt6.QtWidgets import QApplication
+        import main
+        for name, value in (settings or {}).items():
+            setattr(main, name, value)
+
+        app = QApplication.instance() or QApplication([])
+        window = main.MainWindow()
+        main.preload().join()  # Как в приложении: SDK загружены после показа окна, до начала записи
+        recorder = FileRecorder(wavs, speed)
+        window.audio_recorder = recorder
+        last_activity = [time.monotonic()]
+
+        def touch(*args):
+            last_activity[0] = time.monotonic()
+
+        window.chat_processor.finished.connect(touch)
+        window.chat_processor.answer_partial.connect(touch)
+        window.chat_processor.text_ready.connect(touch)
+
+        started = time.monotonic()
+        window.start_recording()
+        while not recorder.finished.is_set():
+            app.processEvents()
+            time.sleep(0.005)
+        finished = time.monotonic()
+        window.stop_recording()  # Последний чанк и обработка по нему
+        touch()
+        while time.monotonic() - last_activity[0] < QUIET_SECONDS and time.monotonic() - finished < MAX_TAIL_SECONDS:
+            app.processEvents()
+            time.sleep(0.005)
+        window.close()
+
+        from tracing import tracer
+        if trace:
+            tracer.export_chrome(trace)
+        report = collect(window.file_manager.text_dir)
+        report["spans"] = tracer.summary()
+        report["audio_seconds"] = recorder.duration
+        report["wall_seconds"] = finished - started
+        report["requests"] = dict(mock.requests)
+        return report
+    finally:
+        os.chdir(workdir)
+        mock.stop()
+
+
+def print_report(report):
+    print(f"Аудио: {report['audio_seconds']:.1f} с, воспроизведение: {report['wall_seconds']:.1f} с, "
+          f"запросы: {report['requests']}")
+    print(f"{'метрика':<12}{'n':>6}{'p50':>10}{'p95':>10}{'среднее':>10}")
+    for name in list(STAGE_EVENTS.values()) + ["rtf"]:
+        if name in report:
+            stats = report[name]
+            unit = "" if name == "rtf" else " мс"
+            print(f"{name:<12}{stats['n']:>6}{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['mean']:>10.2f}{unit}")
+    if report.get("spans"):
+        print(f"{'спан':<20}{'n':>6}{'p50':>10}{'p95':>10}")
+        for name, stats in sorted(report["spans"].items()):
+            print(f"{name:<20}{stats['n']:>6}{stats['p50']:>10.1f}{stats['p95']:>10.1f} мс")
+
+
+def parse_latency(values):
+    """api=среднее:разброс (мс), например openai=500:200"""
+    latency = {}
+    for value in values or []:
+        api, _, spec = value.partition("=")
+        if api not in DEFAULT_LATENCY:
+            raise argparse.ArgumentTypeError(f"неизвестный API {api}, доступны: {', '.join(DEFAULT_LATENCY)}")
+        mean, _, jitter = spec.partition(":")
+        latency[api] = (float(mean), float(jitter or 0))
+    return latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк задержек конвейера на записанных интервью, без сети")
+    parser.add_argument("wavs", nargs="+", help="WAV файлы записи (проигрываются подряд)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Скорость воспроизведения (1 - реальное время)")
+    parser.add_argument("--latency", action="append", metavar="API=MS:JITTER",
+                        help=f"Задержка MockAPI, API: {', '.join(DEFAULT_LATENCY)}")
+    parser.add_argument("--transcript", help="Текстовый файл с тем, что говорится в записи")
+    parser.add_argument("--mode", choices=["serial", "merged", "speculative"], help="PIPELINE_MODE")
+    parser.add_argument("--providers", help="LLM_PROVIDERS через запятую, например gpt,claude")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Сохранить отчет в JSON")
+    parser.add_argument("--trace", help="Сохранить трассировку в формате Chrome trace (chrome://tracing, Perfetto)")
+    args = parser.parse_args()
+
+    settings = {}
+    if args.mode:
+        settings["PIPELINE_MODE"] = args.mode
+    if args.providers:
+        settings["LLM_PROVIDERS"] = tuple(args.providers.split(","))
+    transcript = DEFAULT_TRANSCRIPT
+    if args.transcript:
+        with open(args.transcript, encoding="utf-8") as f:
+            transcript = f.read()
+
+    wavs = [os.path.abspath(path) for path in args.wavs]
+    trace = os.path.abspath(args.trace) if args.trace else None
+    report = run(wavs, args.speed, parse_latency(args.latency), transcript, args.seed, settings, trace)
+    report["settings"] = {"speed": args.speed, "latency": parse_latency(args.latency), "seed": args.seed,
+                          **{name: value for name, value in settings.items()}}
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+# command to run: python src/benchmark.py interview.wav --speed 4 --latency openai=800:300
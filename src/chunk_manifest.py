@@ -0,0 +1,141 @@
+import os
+import re
+import wave
+import threading
+from collections import namedtuple
+
+INDEX_NAME = "index.tsv"  # Индекс чанков в директории чата
+LAST_CHAT_NAME = "last_chat.txt"  # Номер последнего чата в директории с аудио
+
+# start и duration - в секундах от начала чата, offset и size - положение PCM чанка
+# в байтах, если склеить все сохраненные чанки чата подряд
+ManifestEntry = namedtuple('ManifestEntry', ['num', 'start', 'duration', 'offset', 'size', 'speech'])
+
+_CHUNK_NAME = re.compile(r"chunk_(\d+)\.wav$")
+
+
+class ChunkManifest:
+    """Индекс чанков одного чата: счетчик в памяти и дописываемый файл index.tsv.
+
+    Номер следующего чанка и окно последних чанков берутся из памяти, без обхода
+    директории; порядок чанков всегда числовой. Если индекса нет (чат записан
+    старой версией), он строится по файлам чанков в памяти, а index.tsv
+    записывается целиком при первом добавлении чанка. Один экземпляр на чат - get_manifest.
+    """
+
+    def __init__(self, chat_dir):
+        self.chat_dir = chat_dir
+        self.index_path = os.path.join(chat_dir, INDEX_NAME)
+        self.entries = []  # Отсортированы по номеру чанка
+        self.by_num = {}
+        self.lock = threading.Lock()
+        self.persisted = os.path.exists(self.index_path)  # index.tsv содержит все чанки из памяти
+        if self.persisted:
+            self._load()
+        elif os.path.isdir(chat_dir):
+            self._rebuild()
+
+    def _load(self):
+        with open(self.index_path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.split("\t")
+                if len(fields) != len(ManifestEntry._fields):
+                    continue  # Недописанная строка после аварийного завершения
+                try:
+                    entry = ManifestEntry(int(fields[0]), float(fields[1]), float(fields[2]),
+                                          int(fields[3]), int(fields[4]), fields[5].strip() == "1")
+                except ValueError:
+                    continue
+                self._add(entry)
+
+    def _rebuild(self):
+        """Строит индекс в памяти по файлам чанков, если чат записан без него (на диск не пишет)"""
+        nums = sorted(int(match.group(1)) for match in map(_CHUNK_NAME.match, os.listdir(self.chat_dir)) if match)
+        start = 0.0
+        for num in nums:
+            try:
+                with wave.open(self.chunk_path(num), "rb") as w:
+                    duration = w.getnframes() / w.getframerate()
+                    size = w.getnframes() * w.getsampwidth() * w.getnchannels()
+            except (wave.Error, EOFError, OSError):
+                continue
+            offset = self.entries[-1].offset + self.entries[-1].size if self.entries else 0
+            self._add(ManifestEntry(num, start, duration, offset, size, True))
+            start += duration
+
+    def _add(self, entry):
+        if self.entries and entry.num <= self.entries[-1].num:
+            # Чанки пишутся фоновым потоком по порядку, но на всякий случай держим сортировку
+            self.entries = sorted([e for e in self.entries if e.num != entry.num] + [entry])
+        else:
+            self.entries.append(entry)
+        self.by_num[entry.num] = entry
+
+    def chunk_path(self, num):
+        return os.path.join(self.chat_dir, f"chunk_{num}.wav")
+
+    def append(self, num, start, duration, size, speech):
+        """Добавляет чанк в индекс и дописывает строку в index.tsv"""
+        with self.lock:
+            offset = self.entries[-1].offset + self.entries[-1].size if self.entries else 0
+            entry = ManifestEntry(num, start, duration, offset, size, bool(speech))
+            self._add(entry)
+            # Индекс, построенный по файлам, записывается вместе с первым новым чанком
+            written = [entry] if self.persisted else self.entries
+            with open(self.index_path, "a" if self.persisted else "w", encoding="utf-8") as f:
+                for e in written:
+                    f.write(f"{e.num}\t{e.start:.3f}\t{e.duration:.3f}\t{e.offset}\t{e.size}\t{int(e.speech)}\n")
+            self.persisted = True
+        return entry
+
+    def get(self, num):
+        return self.by_num.get(num)
+
+    def last_number(self):
+        with self.lock:
+            return self.entries[-1].num if self.entries else 0
+
+    def count(self):
+        return len(self.entries)
+
+    def numbers(self):
+        with self.lock:
+            return [entry.num for entry in self.entries]
+
+    def slice(self, start=None, end=None):
+        """Чанки по порядку номеров, как срез списка: slice(-5) - последние пять"""
+        with self.lock:
+            return self.entries[start:end]
+
+
+_manifests = {}  # Абсолютный путь директории чата -> ChunkManifest
+_manifests_lock = threading.Lock()
+
+
+def get_manifest(chat_dir):
+    """Общий индекс чата: index.tsv читается один раз, дальше запросы идут из памяти,
+    а чанки, записанные через FileManager, видны сразу"""
+    key = os.path.abspath(chat_dir)
+    with _manifests_lock:
+        manifest = _manifests.get(key)
+        if manifest is None:
+            manifest = _manifests[key] = ChunkManifest(chat_dir)
+        return manifest
+
+
+def next_chat_number(audio_dir):
+    """Номер для нового чата по счетчику last_chat.txt (обход директорий - только если счетчика нет)"""
+    counter_path = os.path.join(audio_dir, LAST_CHAT_NAME)
+    try:
+        with open(counter_path, encoding="utf-8") as f:
+            last = int(f.read().strip())
+    except (OSError, ValueError):
+        last = max((int(d.split('_')[1]) for d in os.listdir(audio_dir)
+                    if d.startswith('chat_') and d.split('_')[1].isdigit()), default=0)
+    num = last + 1
+    # Директорию могли создать в обход счетчика - пропускаем занятые номера
+    while os.path.exists(os.path.join(audio_dir, f"chat_{num}")):
+        num += 1
+    with open(counter_path, "w", encoding="utf-8") as f:
+        f.write(str(num))
+    return num
@@ -0,0 +1,58 @@
+import threading
+from collections import namedtuple, OrderedDict
+
+from vad import trim_silence
+
+MAX_STORED_CHUNKS = 32  # Сколько последних чанков чата держать в памяти
+
+# samples - исходные сэмплы int16, trimmed - они же без длинных пауз (уходят в Whisper)
+Chunk = namedtuple('Chunk', ['num', 'samples', 'trimmed', 'sample_rate', 'speech'])
+
+
+class ChunkStore:
+    """Хранит последние чанки чатов в памяти, чтобы обработка не читала их с диска.
+
+    Пишет GUI поток, читает ChatProcessor, поэтому доступ под блокировкой.
+    """
+
+    def __init__(self, max_chunks=MAX_STORED_CHUNKS):
+        self.max_chunks = max_chunks
+        self.chats = {}  # chat_id -> OrderedDict(номер -> Chunk)
+        self.counters = {}  # chat_id -> номер последнего чанка
+        self.lock = threading.Lock()
+
+    def add(self, chat_id, samples, sample_rate, speech):
+        """Добавляет чанк и возвращает его номер"""
+        # Паузы вырезаем один раз при добавлении, а не в каждом цикле обработки
+        chunk_trimmed = trim_silence(samples, sample_rate, speech.spans)
+        with self.lock:
+            num = self.counters.get(chat_id, 0) + 1
+            self.counters[chat_id] = num
+            chunks = self.chats.setdefault(chat_id, OrderedDict())
+            chunks[num] = Chunk(num, samples, chunk_trimmed, sample_rate, speech)
+            while len(chunks) > self.max_chunks:
+                chunks.popitem(last=False)
+        return num
+
+    def count(self, chat_id):
+        """Сколько чанков добавлено в чат за все время"""
+        with self.lock:
+            return self.counters.get(chat_id, 0)
+
+    def window(self, chat_id, n, max_seconds=None):
+        """Возвращает (чанк перед окном или None, последние n чанков).
+
+        max_seconds ограничивает суммарную длительность окна (последний чанк входит всегда).
+        """
+        with self.lock:
+            chunks = list(self.chats.get(chat_id, {}).values())
+        if max_seconds is not None:
+            seconds = 0.0
+            for count, chunk in enumerate(reversed(chunks[-n:])):
+                seconds += len(chunk.samples) / chunk.sample_rate
+                if count and seconds > max_seconds:
+                    n = count
+                    break
+        window = chunks[-n:]
+        prev = chunks[-n - 1] if len(chunks) > n else None
+        return prev, window
@@ -0,0 +1,113 @@
+import os
+import threading
+import importlib.util
+
+# SDK провайдеров, httpx и dotenv импортируются при первом обращении к клиенту
+# (или заранее в фоне, см. preload): на старте они заметно задерживают появление окна
+
+CONNECT_TIMEOUT = 5.0  # Таймаут установки соединения (секунды)
+READ_TIMEOUT = 60.0  # Таймаут ожидания ответа (секунды)
+POOL_SIZE = 10  # Сколько соединений держать открытыми на один хост
+KEEPALIVE_EXPIRY = 120.0  # Сколько держать простаивающее соединение (секунды)
+
+# Хосты, соединения с которыми прогреваются при старте записи.
+# Адреса API можно переопределить через OPENAI_BASE_URL, ANTHROPIC_BASE_URL, GROK_BASE_URL (например, для бенчмарка)
+WARM_UP_URLS = {
+    "openai": ("OPENAI_BASE_URL", "https://api.openai.com/v1", "/models"),
+    "anthropic": ("ANTHROPIC_BASE_URL", "https://api.anthropic.com", "/v1/models"),
+    "grok": ("GROK_BASE_URL", "https://api.x.ai/v1", "/models"),
+}
+
+# Модули, которые preload импортирует в фоне после появления окна
+PRELOAD_MODULES = ("httpx", "openai", "anthropic", "markdown2")
+
+_clients = {}
+_lock = threading.RLock()
+_env_loaded = False
+
+
+def load_env():
+    """Загружает ключи API из .env (один раз, при первом обращении к клиентам)"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+
+def _get(name, factory):
+    """Возвращает клиент из реестра, создавая его при первом обращении"""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                load_env()
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+def get_http_client():
+    """Общий httpx клиент с пулом keep-alive соединений (HTTP/2, если установлен h2)"""
+    def factory():
+        import httpx
+        return httpx.Client(
+            http2=importlib.util.find_spec("h2") is not None,
+            timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE,
+                                keepalive_expiry=KEEPALIVE_EXPIRY)
+        )
+    return _get("http", factory)
+
+
+def get_openai_client():
+    def factory():
+        from openai import OpenAI
+        return OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            organization=os.getenv("OPENAI_ORGANIZATION"),
+            http_client=get_http_client()
+        )
+    return _get("openai", factory)
+
+
+def preload():
+    """Импортирует тяжелые модули в фоновом потоке, пока пользователь не начал запись"""
+    def run():
+        load_env()
+        for module in PRELOAD_MODULES:
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                print(f"Не удалось загрузить {module}: {str(e)}")
+
+    thread = threading.Thread(target=run, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def warm_up(providers=None):
+    """Заранее открывает соединения с API: клиент Whisper здесь, клиенты LLM - в event loop роутера.
+    providers - какие провайдеры LLM прогреть (по умолчанию все с ключом API).
+    Возвращает Future прогрева роутера"""
+    load_env()
+
+    def run():
+        if not os.getenv("OPENAI_API_KEY"):
+            return
+        env, default, path = WARM_UP_URLS["openai"]
+        try:
+            # Ответ не важен (без ключа будет 401), важно соединение в пуле
+            get_http_client().head(os.getenv(env, default) + path)
+        except Exception as e:
+            print(f"Не удалось прогреть соединение с openai: {str(e)}")
+        get_openai_client()  # Клиент SDK создается заранее, чтобы первый цикл не тратил на это время
+
+    threading.Thread(target=run, daemon=True).start()
+    from llm import get_router  # llm импортирует clients
+    router = get_router()
+    return router.submit(router.warm_up(providers))
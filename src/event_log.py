@@ -0,0 +1,105 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+
+FLUSH_INTERVAL = 0.5  # Как часто сбрасывать буфер файлов на диск (секунды)
+BATCH_SIZE = 256  # Сколько записей писать за один проход
+
+
+class EventLog:
+    """Фоновая запись событий в logs/text/<chat>_log.jsonl, по одной JSON записи на строку.
+
+    write() только кладет запись в очередь: сериализация, запись и сброс на диск
+    идут в отдельном потоке пачками. close() дописывает очередь и делает fsync.
+    """
+
+    def __init__(self, text_dir):
+        self.text_dir = text_dir
+        self.queue = queue.Queue()
+        self.files = {}  # chat -> открытый файл лога
+        self.thread = threading.Thread(target=self._run, name="event-log", daemon=True)
+        self.thread.start()
+
+    def write(self, chat, record):
+        self.queue.put((chat, record))
+
+    def _file(self, chat):
+        f = self.files.get(chat)
+        if f is None:
+            f = open(os.path.join(self.text_dir, f"{chat}_log.jsonl"), "a", encoding="utf-8")
+            self.files[chat] = f
+        return f
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                batch = [self.queue.get(timeout=FLUSH_INTERVAL)]
+            except queue.Empty:
+                batch = []
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = False
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    continue  # Команды сброса обрабатываются после записи пачки
+                if item is None:
+                    stop = True
+                    continue
+                chat, record = item
+                try:
+                    self._file(chat).write(json.dumps(record, ensure_ascii=False) + "\n")
+                except Exception as e:
+                    print(f"Ошибка при записи лога: {str(e)}")
+
+            requests = [item for item in batch if isinstance(item, threading.Event)]
+            if stop or requests or time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                for f in self.files.values():
+                    f.flush()
+                    if stop:
+                        os.fsync(f.fileno())
+                last_flush = time.monotonic()
+            for request in requests:
+                request.set()
+            if stop:
+                for f in self.files.values():
+                    f.close()
+                self.files = {}
+                return
+
+    def flush(self):
+        """Дожидается, пока все записи из очереди окажутся в файлах"""
+        if not self.thread.is_alive():
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+
+    def close(self):
+        """Дописывает очередь, сбрасывает файлы на диск (fsync) и останавливает поток"""
+        if not self.thread.is_alive():
+            return
+        self.queue.put(None)
+        self.thread.join()
+
+
+_event_logs = {}
+_event_logs_lock = threading.Lock()
+
+
+def get_event_log(text_dir):
+    """Общий писатель лога для директории: все FileManager пишут через один поток"""
+    with _event_logs_lock:
+        log = _event_logs.get(text_dir)
+        if log is None or not log.thread.is_alive():
+            log = EventLog(text_dir)
+            _event_logs[text_dir] = log
+            atexit.register(log.close)
+        return log
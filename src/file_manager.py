@@ -1,9 +1,22 @@
+import io
 import os
+import time
+import wave
+import queue
+import threading
 from datetime import datetime
 
+from functions import samples_to_wav
+from chunk_manifest import get_manifest, next_chat_number
+from event_log import get_event_log
+from session_audio import SessionAudio
+
 class FileManager:
-    def __init__(self):
+    def __init__(self, session_format="chunks"):
+        """session_format - как хранить аудио чата: "chunks" - файлы chunk_K.wav,
+        "pcm" - один файл session.pcm (см. SessionAudio)"""
         self.current_chat = None
+        self.session_format = session_format
         # Создаем директории если их нет
         self.audio_dir = os.path.join("logs", "audio")
         self.text_dir = os.path.join("logs", "text")
@@ -11,74 +24,138 @@ class FileManager:
             os.makedirs(self.audio_dir)
         if not os.path.exists(self.text_dir):
             os.makedirs(self.text_dir)
+        # Фоновая запись чанков на диск (поток запускается при первом чанке)
+        self.write_queue = queue.Queue()
+        self.writer = None
+        self.sessions = {}  # chat -> SessionAudio
+        self.chat_started = None  # Время начала текущего чата (time.time)
+
+    def manifest(self, chat=None):
+        """Индекс чанков чата (загружается один раз, общий с functions.py)"""
+        return get_manifest(os.path.join(self.audio_dir, chat or self.current_chat))
+
+    def session(self, chat=None, sample_rate=16000):
+        """Файл аудио чата для session_format = "pcm" """
+        chat = chat or self.current_chat
+        session = self.sessions.get(chat)
+        if session is None:
+            session = self.sessions.setdefault(chat, SessionAudio(os.path.join(self.audio_dir, chat), sample_rate))
+        return session
         
-    def log_event(self, event_type, details):
-        """Логирует событие в файл"""
-        if not self.current_chat:
+    def log_event(self, event_type, details, chat=None, **fields):
+        """Логирует событие в logs/text/<chat>_log.jsonl. fields - дополнительные поля записи:
+        cycle (номер задания), stage (стадия конвейера), duration_ms, bytes, tokens и т.п."""
+        chat = chat or self.current_chat
+        if not chat:
             return
             
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_file = os.path.join(self.text_dir, f"{self.current_chat}_log.txt")
-        
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(f"{timestamp} - {event_type}: {details}\n")
+        # Запись только ставится в очередь, файл пишет фоновый поток
+        record = {"time": datetime.now().isoformat(timespec="milliseconds"), "event": event_type,
+                  "details": details}
+        record.update(fields)
+        get_event_log(self.text_dir).write(chat, record)
         
     def create_chat_directory(self):
         """Создает новую директорию для чата"""
-        # Находим следующий доступный номер чата
-        existing_chats = [d for d in os.listdir(self.audio_dir) 
-                         if os.path.isdir(os.path.join(self.audio_dir, d)) and d.startswith('chat_')]
-        if existing_chats:
-            last_chat = max(int(chat.split('_')[1]) for chat in existing_chats)
-            chat_num = last_chat + 1
-        else:
-            chat_num = 1
+        # Следующий номер чата берем из счетчика, а не обходом всех директорий
+        chat_num = next_chat_number(self.audio_dir)
             
         # Создаем директорию для нового чата
         chat_dir = os.path.join(self.audio_dir, f'chat_{chat_num}')
         os.makedirs(chat_dir, exist_ok=True)
         self.current_chat = f'chat_{chat_num}'
+        self.chat_started = time.time()
         
         # Логируем создание нового чата
         self.log_event("Создан новый чат", f"chat_{chat_num}")
         
         return chat_dir
         
-    def save_audio_chunk(self, chunk_data):
-        """Сохраняет чанк аудио в текущую директорию чата"""
-        if not self.current_chat:
+    def save_audio_chunk(self, chunk_data, speech=None, chunk_num=None, chat=None, start=None,
+                         duration=None, size=None):
+        """Сохраняет чанк аудио в директорию чата и добавляет его в индекс. speech - результат
+        детектора речи, chunk_num - номер чанка (если не задан, берется следующий по индексу),
+        start, duration - начало и длительность чанка в секундах от начала чата, size - байт PCM"""
+        chat = chat or self.current_chat
+        if not chat:
             return None
             
-        # Находим следующий доступный номер чанка
-        chat_dir = os.path.join(self.audio_dir, self.current_chat)
-        existing_chunks = [f for f in os.listdir(chat_dir) 
-                          if f.startswith('chunk_') and f.endswith('.wav')]
-        if existing_chunks:
-            last_chunk = max(int(chunk.split('_')[1].split('.')[0]) for chunk in existing_chunks)
-            chunk_num = last_chunk + 1
-        else:
-            chunk_num = 1
+        manifest = self.manifest(chat)
+        if chunk_num is None:
+            chunk_num = manifest.last_number() + 1
             
         # Сохраняем чанк
-        filepath = os.path.join(chat_dir, f'chunk_{chunk_num}.wav')
+        filepath = manifest.chunk_path(chunk_num)
         with open(filepath, 'wb') as f:
             f.write(chunk_data)
-            
-        # Логируем сохранение чанка
-        self.log_event("Сохранен чанк", f"chunk_{chunk_num}")
-        
+        if duration is None:
+            with wave.open(io.BytesIO(chunk_data), 'rb') as w:
+                duration = w.getnframes() / w.getframerate()
+                size = w.getnframes() * w.getsampwidth() * w.getnchannels()
+        if start is None:
+            last = manifest.slice(-1)
+            start = last[0].start + last[0].duration if last else 0.0
+        manifest.append(chunk_num, start, duration, size, speech is None or bool(speech.spans))
+        self._log_chunk(chat, chunk_num, speech, duration, size)
         return filepath
+
+    def save_session_chunk(self, samples, sample_rate, speech, chunk_num, chat, start, duration):
+        """Дописывает чанк в session.pcm чата, положение чанка запоминает индекс"""
+        manifest = self.manifest(chat)
+        offset = self.session(chat, sample_rate).append(samples)
+        entry = manifest.append(chunk_num, start or 0.0, duration, samples.nbytes,
+                                speech is None or bool(speech.spans))
+        if entry.offset != offset:
+            print(f"Индекс чанков {chat} расходится с session.pcm: {entry.offset} != {offset}")
+        self._log_chunk(chat, chunk_num, speech, duration, samples.nbytes)
+
+    def _log_chunk(self, chat, chunk_num, speech, duration, size):
+        fields = {"chunk": chunk_num, "audio_seconds": round(duration, 3), "bytes": size}
+        if speech is not None:
+            self.log_event("Сохранен чанк", f"chunk_{chunk_num}, речь: {speech.ratio:.0%}, участки: {speech.spans}", chat,
+                           speech=round(speech.ratio, 3), **fields)
+        else:
+            self.log_event("Сохранен чанк", f"chunk_{chunk_num}", chat, **fields)
+
+    def save_audio_chunk_async(self, samples, sample_rate, chunk_num, speech=None):
+        """Ставит чанк в очередь на запись: кодирование и запись идут в фоновом потоке"""
+        if not self.current_chat:
+            return
+        if self.writer is None:
+            self.writer = threading.Thread(target=self._write_loop, daemon=True)
+            self.writer.start()
+        duration = len(samples) / sample_rate
+        start = max(time.time() - self.chat_started - duration, 0.0) if self.chat_started else None
+        self.write_queue.put((self.current_chat, samples, sample_rate, chunk_num, speech, start, duration))
+
+    def _write_loop(self):
+        while True:
+            chat, samples, sample_rate, chunk_num, speech, start, duration = self.write_queue.get()
+            try:
+                if self.session_format == "pcm":
+                    self.save_session_chunk(samples, sample_rate, speech, chunk_num, chat, start, duration)
+                else:
+                    self.save_audio_chunk(samples_to_wav(samples, sample_rate), speech, chunk_num, chat,
+                                          start, duration, samples.nbytes)
+            except Exception as e:
+                print(f"Ошибка при сохранении чанка: {str(e)}")
+            finally:
+                self.write_queue.task_done()
+
+    def flush(self):
+        """Дожидается записи всех чанков и событий из очередей"""
+        self.write_queue.join()
+        get_event_log(self.text_dir).flush()
+
+    def close(self):
+        """Дописывает очереди и сбрасывает лог на диск перед выходом"""
+        self.write_queue.join()
+        for session in self.sessions.values():
+            session.close()
+        get_event_log(self.text_dir).close()
         
     def get_next_chunk_number(self):
         """Возвращает номер следующего чанка"""
         if not self.current_chat:
             return None
-            
-        chat_dir = os.path.join(self.audio_dir, self.current_chat)
-        existing_chunks = [f for f in os.listdir(chat_dir) 
-                          if f.startswith('chunk_') and f.endswith('.wav')]
-        if existing_chunks:
-            last_chunk = max(int(chunk.split('_')[1].split('.')[0]) for chunk in existing_chunks)
-            return last_chunk + 1
-        else:
-            return 1 
\ No newline at end of file
+        return self.manifest().last_number() + 1 
\ No newline at end of file
@@ -1,129 +1,128 @@
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
+import time
 import wave
-from anthropic import Anthropic
-import requests
+import io
+import struct
+import numpy as np
 
-load_dotenv()
+from vad import detect_speech, trim_silence
+from llm import get_router
+from transcription import OpenAIEngine
+from chunk_manifest import get_manifest
+from tracing import span
+from session_audio import SessionAudio
+from clients import get_openai_client
 
-OPENAI_ORGANIZATION = os.getenv("OPENAI_ORGANIZATION")
-
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-CLAUDE_API_KEY = os.getenv("CLAUDE_API_KEY")
-CLAUDE_MODEL = os.getenv("CLAUDE_MODEL")
-GROK_API_KEY = os.getenv("GROK_API_KEY")    
-
-def unite_chunks(chat_id, start_chunk, end_chunk, output_file):
-    """Объединяет чанки аудио в один файл"""
+def unite_chunks(chat_id, start_chunk, end_chunk, output_file, remove_silence=False):
+    """Объединяет чанки аудио в один файл. start_chunk, end_chunk - срез списка чанков
+    по порядку номеров (unite_chunks(1, N-5, N, ...) - последние пять). remove_silence - вырезать длинные паузы"""
     try:
-        # Получаем список чанков
-        chat_dir = f"logs/audio/chat_{chat_id}"
-        chunks = sorted([f for f in os.listdir(chat_dir) if f.startswith('chunk_') and f.endswith('.wav')])
-        
-        if not chunks:
-            return False
-            
-        # Объединяем чанки
-        with wave.open(output_file, 'wb') as output:
-            for i, chunk in enumerate(chunks[start_chunk:end_chunk]):
-                with wave.open(os.path.join(chat_dir, chunk), 'rb') as w:
-                    if i == 0:
-                        output.setparams(w.getparams())
-                    output.writeframes(w.readframes(w.getnframes()))
-        return True
+        with span("unite_chunks") as s:
+            return _unite_chunks(chat_id, start_chunk, end_chunk, output_file, remove_silence, s)
     except Exception as e:
         print(f"Ошибка при объединении чанков: {str(e)}")
         return False
 
-def count_chunks(chat_id):
-    """Возвращает количество чанков в чате"""
-    try:
-        return len(os.listdir(f"logs/audio/chat_{chat_id}"))
-    except:
-        return 0
-
-def chat_question_claude(question, temperature=0, prep="", conversation_id=None):
-    anthropic = Anthropic(api_key=CLAUDE_API_KEY)
+def _unite_chunks(chat_id, start_chunk, end_chunk, output_file, remove_silence, s):
+    """Тело unite_chunks, s - спан трассировки для счетчиков"""
+    # Чанки берем из индекса чата, по возрастанию номеров
+    chat_dir = f"logs/audio/chat_{chat_id}"
+    manifest = get_manifest(chat_dir)
+    chunks = manifest.slice(start_chunk, end_chunk)
+    s.set(chunks=len(chunks))
     
-    try:
-        messages = []
-        if prep:
-            messages.append({
-                "role": "system",
-                "content": prep
-            })
-        
-        messages.append({
-            "role": "user",
-            "content": question
-        })
-        
-        response = anthropic.messages.create(
-            model=CLAUDE_MODEL,
-            max_tokens=1000,
-            messages=messages,
-            temperature=temperature
-        )
-        
-        return response.content[0].text
+    if not chunks:
+        return False
+
+    if SessionAudio.exists(chat_dir):
+        # Чат хранится одним файлом: окно читается одним срезом
+        session = SessionAudio(chat_dir)
+        samples = session.read_entries(chunks)
+        if remove_silence:
+            samples = _remove_silence(samples, session.sample_rate)
+            if samples is None:
+                return False
+        session.export_wav(output_file, samples=samples)
+        s.set(bytes=samples.nbytes)
+        return True
         
-    except Exception as e:
-        print(f"Error in Claude request: {str(e)}")
-        return "An error occurred while processing your request. Please try again."
+    # Объединяем чанки
+    params = None
+    frames = []
+    for chunk in chunks:
+        with wave.open(manifest.chunk_path(chunk.num), 'rb') as w:
+            if params is None:
+                params = w.getparams()
+            frames.append(w.readframes(w.getnframes()))
+    if params is None:
+        return False
+    audio_data = b"".join(frames)
 
+    if remove_silence:
+        samples = _remove_silence(np.frombuffer(audio_data, dtype=np.int16), params.framerate)
+        if samples is None:
+            return False
+        audio_data = samples.tobytes()
 
-def chat_question_grok(question, temperature=0, prep="You are a test assistant."):
-    url = "https://api.x.ai/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {GROK_API_KEY}"
-    }
-    
-    data = {
-        "messages": [
-            {
-                "role": "system",
-                "content": prep
-            },
-            {
-                "role": "user",
-                "content": question
-            }
-        ],
-        "model": "grok-2-latest",
-        "stream": False,
-        "temperature": temperature
-    }
-    
-    try:
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        
-        return response.json()['choices'][0]['message']['content']
-        
-    except requests.exceptions.RequestException as e:
-        print(f"Error making request to Grok API: {str(e)}")
-        return "An error occurred while processing your request. Please try again."
+    with wave.open(output_file, 'wb') as output:
+        output.setparams(params)
+        output.writeframes(audio_data)
+    s.set(bytes=len(audio_data))
+    return True
+
+def _remove_silence(samples, sample_rate):
+    """Вырезает длинные паузы, None - если речи нет"""
+    speech = detect_speech(samples, sample_rate)
+    if not speech.spans:
+        return None
+    return trim_silence(samples, sample_rate, speech.spans)
 
-def chat_question_gpt(question, temperature = 0, prep="", conversation_id=None):
-    client = OpenAI(organization=OPENAI_ORGANIZATION)
-    messages = [{"role": "system", "content": prep}]
-    messages.append({"role": "user", "content": question})
+def list_chunks(chat_id):
+    """Возвращает номера чанков чата по возрастанию"""
+    return get_manifest(f"logs/audio/chat_{chat_id}").numbers()
 
-    completion = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        temperature=temperature
-    )
+def read_wav(wav_data):
+    """Читает WAV (байты) в массив int16, возвращает (сэмплы, частота)"""
+    with wave.open(io.BytesIO(wav_data), 'rb') as w:
+        samples = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+        return samples, w.getframerate()
 
-    answer = completion.choices[0].message.content
+def samples_to_wav(samples, sample_rate, channels=1):
+    """Кодирует массив int16 в WAV (байты)"""
+    with io.BytesIO() as wav_buffer:
+        with wave.open(wav_buffer, 'wb') as wav_file:
+            wav_file.setnchannels(channels)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(sample_rate)
+            wav_file.writeframes(samples.tobytes())
+        return wav_buffer.getvalue()
+
+def wav_from_buffers(buffers, sample_rate, channels=1):
+    """Собирает WAV из нескольких массивов int16 в один заранее выделенный буфер.
+    Каждый сэмпл копируется ровно один раз, без промежуточных склеек и кодирования"""
+    data_size = sum(buf.nbytes for buf in buffers)
+    wav = bytearray(44 + data_size)
+    struct.pack_into('<4sI4s4sIHHIIHH4sI', wav, 0,
+                     b'RIFF', 36 + data_size, b'WAVE', b'fmt ', 16, 1, channels,
+                     sample_rate, sample_rate * channels * 2, channels * 2, 16,
+                     b'data', data_size)
+    view = memoryview(wav)
+    offset = 44
+    for buf in buffers:
+        view[offset:offset + buf.nbytes] = memoryview(np.ascontiguousarray(buf)).cast('B')
+        offset += buf.nbytes
+    return wav
+
+def count_chunks(chat_id):
+    """Возвращает количество чанков в чате"""
+    return get_manifest(f"logs/audio/chat_{chat_id}").count()
 
+def chat_question_gpt(question, temperature=0, prep=""):
+    """Блокирующий запрос к GPT через общий роутер (для скриптов)"""
+    answer, _ = get_router().ask(question, ("gpt",), temperature=temperature, prep=prep)
     return answer
 
 def audio_to_text(wav_file_path):
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = get_openai_client()
     
     try:
         # Открываем и отправляем файл на распознавание
@@ -139,19 +138,85 @@ def audio_to_text(wav_file_path):
         print(f"Ошибка при распознавании речи: {str(e)}")
         return None
     
-def text_to_good_text(text, prompt):
+def audio_to_words(audio_file):
+    """Распознает речь с временными метками слов и сегментов через OpenAI.
+    audio_file - путь к файлу или кортеж (имя, байты)"""
+    return OpenAIEngine().transcribe(audio_file)
+
+def _ask(question, providers, hedge_after_ms, on_partial=None, track=None, name="llm", prep=""):
+    """Запрос через роутер. track получает Future запроса (например, чтобы отменить его).
+    name - имя спана трассировки, prep - системный промпт (строка или блоки из prompt_context).
+    В спан пишутся токены, попадания в кеш промпта и время до первого токена"""
+    with span(name, prompt_chars=len(question)) as s:
+        def on_usage(usage):
+            s.set(input_tokens=usage.input_tokens, output_tokens=usage.output_tokens,
+                  cached_tokens=usage.cached_tokens)
+
+        def on_first_token(provider):
+            s.set(ttft_ms=round((time.perf_counter() - s.start) * 1000, 1))
+
+        future = get_router().ask_async(question, providers, hedge_after_ms, on_partial, prep=prep,
+                                        on_usage=on_usage, on_first_token=on_first_token)
+        if track is not None:
+            track(future)
+        answer, provider = future.result()
+        s.set(provider=provider, answer_chars=len(answer or ""))
+    return answer
+
+
+def text_to_good_text(text, prompt, providers=("gpt",), hedge_after_ms=None, track=None, prep=""):
     question = prompt.replace("[[TEXT]]", text)
-    answer = chat_question_gpt(question)
+    answer = _ask(question, providers, hedge_after_ms, track=track, name="llm.improve", prep=prep)
     
     return answer
 
 
-def gt_to_answer(text, answer_prompt):
+def gt_to_answer(text, answer_prompt, on_partial=None, providers=("gpt",), hedge_after_ms=None, track=None,
+                 prep=""):
+    """Генерирует подсказку. on_partial вызывается с накопленным текстом после каждого фрагмента.
+    providers - порядок провайдеров для hedged запроса (см. LLMRouter.hedged)"""
     question = answer_prompt.replace("[[TEXT]]", text)
-    answer = chat_question_gpt(question)
+    answer = _ask(question, providers, hedge_after_ms, on_partial, track, name="llm.answer", prep=prep)
     
     return answer
 
+
+def gt_to_answer_async(text, answer_prompt, on_partial=None, providers=("gpt",), hedge_after_ms=None, prep=""):
+    """Как gt_to_answer, но не блокирует: возвращает Future с кортежем (ответ, провайдер)"""
+    question = answer_prompt.replace("[[TEXT]]", text)
+    return get_router().ask_async(question, providers, hedge_after_ms, on_partial, prep=prep)
+
+
+def split_combined(output):
+    """Разбирает ответ на combined_prompt на (текст, подсказка). Пока маркера подсказки нет - подсказка None"""
+    if ANSWER_MARKER not in output:
+        return output.replace(TEXT_MARKER, "").strip(), None
+    text, answer = output.split(ANSWER_MARKER, 1)
+    return text.replace(TEXT_MARKER, "").strip(), answer.strip()
+
+
+def text_and_answer(raw_text, prompt, on_text=None, on_partial=None, providers=("gpt",), hedge_after_ms=None,
+                    track=None, prep=""):
+    """Улучшает текст и генерирует подсказку одним запросом (prompt - combined_prompt).
+    on_text вызывается один раз, как только улучшенный текст готов; on_partial - с накопленной подсказкой.
+    Возвращает (текст, подсказка)"""
+    question = prompt.replace("[[TEXT]]", raw_text)
+    state = {"text_sent": False}
+
+    def on_output(output):
+        text, answer = split_combined(output)
+        if answer is None:
+            return
+        if not state["text_sent"]:
+            state["text_sent"] = True
+            if on_text is not None:
+                on_text(text)
+        if on_partial is not None and answer:
+            on_partial(answer)
+
+    output = _ask(question, providers, hedge_after_ms, on_output, track, name="llm.merged", prep=prep)
+    return split_combined(output)
+
 improve_text_prompt = f"""
 Перед тобой текст расшифровки аудио модели whisper.
 Твоя задача - переписать текст так, чтобы он был понятен и читабелен.
@@ -182,3 +247,28 @@ answer_prompt =f"""
 
 
     """
+
+TEXT_MARKER = "### ТЕКСТ"
+ANSWER_MARKER = "### ПОДСКАЗКА"
+
+combined_prompt = f"""
+Ты умный помощник на собеседовании на аналитика данных. Прямо сейчас идёт собеседование, ниже расшифровка аудио модели whisper:
+
+[[TEXT]]
+
+Слова могли неверно распознаться, поэтому по контексту пойми, что имелось ввиду.
+Возможные термины: pandas, python, sql, статистика, проверка гипотез, ad hoc задачи
+
+Ответ дай строго в двух разделах, с заголовками ровно как ниже:
+
+{TEXT_MARKER}
+Расшифровка, переписанная понятно и читабельно. Только текст, без комментариев.
+
+{ANSWER_MARKER}
+Краткая, полезная выжимка для кандидата — как шпаргалка. Никаких вступлений, пояснений, воды.
+1. Чётко сформулируй, в чём сейчас основной вопрос интервьюера (1 предложение).
+2. Дай 2–3 пункта краткого пошагового решения, с минимально необходимыми пояснениями и примерами кода на Python.
+3. В конце — 1 дополнительный совет, как ответить на уточняющие вопросы или углубить тему.
+
+Только факты. Только по делу.
+"""
@@ -0,0 +1,323 @@
+import asyncio
+import importlib.util
+import json
+import os
+import threading
+from collections import namedtuple
+
+from clients import CONNECT_TIMEOUT, READ_TIMEOUT, POOL_SIZE, KEEPALIVE_EXPIRY, WARM_UP_URLS, load_env
+
+# Сколько одновременных запросов разрешено каждому провайдеру
+PROVIDER_CONCURRENCY = {"gpt": 4, "claude": 4, "grok": 2}
+
+# Расход токенов запроса: провайдер присылает его в конце потока.
+# input_tokens - весь промпт, cached_tokens - сколько из него прочитано из кеша провайдера
+Usage = namedtuple('Usage', ['input_tokens', 'output_tokens', 'cached_tokens'], defaults=(0,))
+
+
+def _system_text(prep):
+    """Системный промпт одной строкой. prep - строка или кортеж неизменных блоков"""
+    return "\n\n".join(prep) if isinstance(prep, (tuple, list)) else prep
+
+
+def _async_http_client():
+    import httpx
+    return httpx.AsyncClient(
+        http2=importlib.util.find_spec("h2") is not None,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE,
+                            keepalive_expiry=KEEPALIVE_EXPIRY)
+    )
+
+
+class Provider:
+    """Асинхронный провайдер LLM. stream() - асинхронный генератор фрагментов ответа
+    (последним может прийти Usage с расходом токенов).
+
+    Клиенты (и SDK) создаются при первом запросе, уже внутри event loop роутера.
+    prep - системный промпт: строка или кортеж блоков (см. prompt_context.system_prefix).
+    Системный промпт всегда идет первым, а меняющийся текст - последним, поэтому
+    префикс запроса стабилен и провайдер берет его из кеша.
+    """
+    name = None
+    api = None  # Ключ WARM_UP_URLS: адрес API для прогрева
+    key_env = None  # Переменная окружения с ключом API
+
+    def __init__(self, concurrency):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.client = None
+
+    def create_client(self):
+        raise NotImplementedError
+
+    def ensure_client(self):
+        if self.client is None:
+            load_env()
+            self.client = self.create_client()
+        return self.client
+
+    def configured(self):
+        load_env()
+        return bool(os.getenv(self.key_env))
+
+    def warm_up_url(self):
+        env, default, path = WARM_UP_URLS[self.api]
+        return os.getenv(env, default) + path
+
+    async def _ping(self):
+        raise NotImplementedError
+
+    async def warm_up(self):
+        """Создает клиент и открывает соединение дешевым запросом (ответ не важен, без ключа будет 401)"""
+        self.ensure_client()
+        await self._ping()
+
+    async def _stream(self, question, temperature, prep):
+        raise NotImplementedError
+        yield
+
+    async def stream(self, question, temperature=0, prep=""):
+        async with self.semaphore:
+            self.ensure_client()
+            async for delta in self._stream(question, temperature, prep):
+                yield delta
+
+
+class GPTProvider(Provider):
+    name = "gpt"
+    api = "openai"
+    key_env = "OPENAI_API_KEY"
+    model = "gpt-4o"
+
+    def create_client(self):
+        from openai import AsyncOpenAI
+        self.http = _async_http_client()
+        return AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            organization=os.getenv("OPENAI_ORGANIZATION"),
+            http_client=self.http
+        )
+
+    async def _ping(self):
+        # Соединение остается в пуле httpx клиента, через который работает SDK
+        await self.http.head(self.warm_up_url())
+
+    async def _stream(self, question, temperature, prep):
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "system", "content": _system_text(prep)}, {"role": "user", "content": question}],
+            temperature=temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if chunk.usage is not None:
+                # Кеш префикса у OpenAI автоматический (от 1024 токенов), попадания - в prompt_tokens_details
+                details = getattr(chunk.usage, "prompt_tokens_details", None)
+                yield Usage(chunk.usage.prompt_tokens, chunk.usage.completion_tokens,
+                            getattr(details, "cached_tokens", None) or 0)
+
+
+class ClaudeProvider(Provider):
+    name = "claude"
+    api = "anthropic"
+    key_env = "CLAUDE_API_KEY"
+
+    def create_client(self):
+        from anthropic import AsyncAnthropic
+        return AsyncAnthropic(api_key=os.getenv("CLAUDE_API_KEY"), timeout=READ_TIMEOUT)
+
+    async def _ping(self):
+        await self.client.get("/v1/models", cast_to=object)
+
+    async def _stream(self, question, temperature, prep):
+        params = {
+            "model": os.getenv("CLAUDE_MODEL"),
+            "max_tokens": 1000,
+            "messages": [{"role": "user", "content": question}],
+            "temperature": temperature
+        }
+        if isinstance(prep, (tuple, list)):
+            # Точка кеширования после каждого блока: общий блок переиспользуется запросами
+            # с разными инструкциями (не больше четырех точек на запрос)
+            params["system"] = [{"type": "text", "text": block, "cache_control": {"type": "ephemeral"}}
+                                for block in prep[:4]]
+        elif prep:
+            params["system"] = prep
+        async with self.client.messages.stream(**params) as stream:
+            async for text in stream.text_stream:
+                yield text
+            usage = (await stream.get_final_message()).usage
+            cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+            cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+            # input_tokens у Anthropic - только некешированная часть промпта
+            yield Usage(usage.input_tokens + cache_read + cache_write, usage.output_tokens, cache_read)
+
+
+class GrokProvider(Provider):
+    name = "grok"
+    api = "grok"
+    key_env = "GROK_API_KEY"
+    model = "grok-2-latest"
+
+    @property
+    def url(self):
+        return os.getenv("GROK_BASE_URL", "https://api.x.ai/v1") + "/chat/completions"
+
+    def create_client(self):
+        return _async_http_client()
+
+    async def _ping(self):
+        await self.client.head(self.warm_up_url())
+
+    async def _stream(self, question, temperature, prep):
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {os.getenv('GROK_API_KEY')}"
+        }
+        data = {
+            "messages": [
+                {"role": "system", "content": _system_text(prep) or "You are a test assistant."},
+                {"role": "user", "content": question}
+            ],
+            "model": self.model,
+            "stream": True,
+            "temperature": temperature
+        }
+        async with self.client.stream("POST", self.url, headers=headers, json=data) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                delta = json.loads(payload)['choices'][0]['delta'].get('content')
+                if delta:
+                    yield delta
+
+
+PROVIDERS = {provider.name: provider for provider in (GPTProvider, ClaudeProvider, GrokProvider)}
+
+
+class LLMRouter:
+    """Единый асинхронный интерфейс к провайдерам LLM.
+
+    Event loop работает в отдельном потоке и живет все время работы приложения,
+    поэтому пулы соединений асинхронных клиентов переиспользуются между циклами.
+    """
+
+    def __init__(self, concurrency=PROVIDER_CONCURRENCY):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.providers = {name: PROVIDERS[name](limit) for name, limit in concurrency.items()}
+
+    def submit(self, coro):
+        """Запускает корутину в event loop роутера, возвращает concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def hedged(self, question, providers, hedge_after_ms=None, on_partial=None, temperature=0, prep="",
+                     on_usage=None, on_first_token=None):
+        """Отправляет запрос первому провайдеру; если за hedge_after_ms нет первого токена
+        (или провайдер упал), дублирует запрос следующему. Побеждает тот, кто первым
+        прислал токен, остальные запросы отменяются. Возвращает (текст, провайдер).
+        on_usage получает Usage победителя, если провайдер его прислал,
+        on_first_token - имя победителя в момент его первого токена"""
+        pending = list(providers)
+        tasks = {}
+        state = {"winner": None}
+        first_token = asyncio.Event()
+
+        async def run(name):
+            parts = []
+            async for delta in self.providers[name].stream(question, temperature, prep):
+                if isinstance(delta, Usage):
+                    if on_usage is not None and state["winner"] == name:
+                        on_usage(delta)
+                    continue
+                if state["winner"] is None:
+                    state["winner"] = name
+                    first_token.set()
+                    if on_first_token is not None:
+                        on_first_token(name)
+                    for other, task in tasks.items():
+                        if other != name:
+                            task.cancel()
+                elif state["winner"] != name:
+                    return None
+                parts.append(delta)
+                if on_partial is not None:
+                    on_partial("".join(parts))
+            return "".join(parts)
+
+        def launch():
+            name = pending.pop(0)
+            tasks[name] = asyncio.create_task(run(name))
+
+        launch()
+        try:
+            while state["winner"] is None:
+                active = [task for task in tasks.values() if not task.done()]
+                if not active:
+                    if not pending:
+                        break
+                    launch()
+                    continue
+                timeout = hedge_after_ms / 1000 if pending and hedge_after_ms is not None else None
+                waiter = asyncio.create_task(first_token.wait())
+                done, _ = await asyncio.wait(active + [waiter], timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+                if not done and pending:
+                    launch()
+
+            if state["winner"] is not None:
+                return await tasks[state["winner"]], state["winner"]
+
+            # Никто не прислал ни одного токена: отдаем пустой ответ или первую ошибку
+            errors = [task.exception() for task in tasks.values() if task.exception() is not None]
+            if len(errors) == len(tasks):
+                raise errors[0]
+            return "", None
+        finally:
+            for task in tasks.values():
+                task.cancel()
+
+    async def warm_up(self, providers=None):
+        """Заранее создает клиентов провайдеров (с ключом API) и открывает соединения,
+        чтобы первый цикл не тратил время на импорт SDK и TCP+TLS"""
+        async def run(provider):
+            try:
+                await provider.warm_up()
+            except Exception as e:
+                print(f"Не удалось прогреть соединение с {provider.name}: {str(e)}")
+
+        names = self.providers if providers is None else providers
+        await asyncio.gather(*(run(self.providers[name]) for name in names
+                               if name in self.providers and self.providers[name].configured()))
+
+    def ask_async(self, question, providers=("gpt",), hedge_after_ms=None, on_partial=None, temperature=0, prep="",
+                  on_usage=None, on_first_token=None):
+        """Неблокирующий запрос: возвращает Future с кортежем (текст, провайдер)"""
+        return self.submit(self.hedged(question, providers, hedge_after_ms, on_partial, temperature, prep, on_usage,
+                                       on_first_token))
+
+    def ask(self, question, providers=("gpt",), hedge_after_ms=None, on_partial=None, temperature=0, prep=""):
+        """Блокирующий запрос из обычного потока, возвращает (текст, провайдер)"""
+        return self.ask_async(question, providers, hedge_after_ms, on_partial, temperature, prep).result()
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """Возвращает общий роутер, запуская его при первом обращении"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = LLMRouter()
+        return _router
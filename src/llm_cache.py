@@ -0,0 +1,125 @@
+import re
+import time
+import hashlib
+import threading
+from collections import namedtuple, OrderedDict
+
+import numpy as np
+
+CACHE_SIZE = 64  # Сколько ответов держать в кеше
+CACHE_TTL = 600  # Сколько секунд ответ считается актуальным
+SIMILARITY_THRESHOLD = 0.9  # Порог похожести (оценка Жаккара по MinHash) для повторного использования
+SHINGLE_SIZE = 3  # Длина шингла в словах
+NUM_HASHES = 64  # Длина MinHash сигнатуры
+MAX_NEW_WORDS = 2  # Сколько новых слов (ошибки распознавания) допускает похожее окно при max_new_words
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(42)
+_A = _rng.randint(1, _PRIME, NUM_HASHES).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, NUM_HASHES).astype(np.uint64)
+
+CacheEntry = namedtuple('CacheEntry', ['value', 'signature', 'words', 'created'])
+
+
+def normalize(text):
+    """Нормализует текст: регистр, ё, пунктуация и пробелы не влияют на ключ"""
+    text = text.lower().replace("ё", "е")
+    return " ".join(re.findall(r"\w+", text))
+
+
+def minhash(text):
+    """MinHash сигнатура множества шинглов нормализованного текста"""
+    words = text.split()
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))}
+    hashes = np.array([int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+                       for s in shingles], dtype=np.uint64) & np.uint64(_PRIME)
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % np.uint64(_PRIME)).min(axis=1)
+
+
+class LLMCache:
+    """LRU кеш ответов LLM с TTL, ключ - хеш промпта и нормализованного текста.
+
+    Если точного совпадения нет, ищется почти такой же текст того же промпта по MinHash.
+    """
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL, threshold=SIMILARITY_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.entries = OrderedDict()  # (хеш промпта, хеш текста) -> CacheEntry
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(prompt, text):
+        prompt_key = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+        return prompt_key, hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def _expire(self, now):
+        for key in [key for key, entry in self.entries.items() if now - entry.created > self.ttl]:
+            del self.entries[key]
+
+    def get(self, prompt, text, similar=True, max_new_words=None):
+        """Возвращает закешированный ответ для prompt и text (или почти такого же text), иначе None.
+        similar=False - только точное совпадение. max_new_words - похожий текст подходит, только если
+        в text не больше стольких слов, которых в нем не было (дописанный вопрос - это промах)"""
+        text = normalize(text)
+        key = self._key(prompt, text)
+        with self.lock:
+            self._expire(time.time())
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if not similar:
+                self.misses += 1
+                return None
+
+            signature = minhash(text)
+            best_key, best_similarity = None, 0.0
+            words = set(text.split())
+            for other_key, other in self.entries.items():
+                if other_key[0] != key[0]:
+                    continue
+                if max_new_words is not None and len(words - other.words) > max_new_words:
+                    continue
+                similarity = float(np.mean(other.signature == signature))
+                if similarity > best_similarity:
+                    best_key, best_similarity = other_key, similarity
+            if best_key is not None and best_similarity >= self.threshold:
+                self.entries.move_to_end(best_key)
+                self.near_hits += 1
+                return self.entries[best_key].value
+
+            self.misses += 1
+            return None
+
+    def put(self, prompt, text, value):
+        text = normalize(text)
+        key = self._key(prompt, text)
+        with self.lock:
+            self.entries[key] = CacheEntry(value, minhash(text), frozenset(text.split()), time.time())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        return f"попаданий: {self.hits}, похожих: {self.near_hits}, промахов: {self.misses}"
+
+
+if __name__ == "__main__":
+    # Проверка: похожее окно с тем же текстом - попадание, окно с дописанным вопросом - промах
+    window = " ".join(f"слово{i % 40} пример{i % 7}" for i in range(80))
+    question = "А почему вы выбрали именно Kafka а не RabbitMQ?"
+    cache = LLMCache()
+    cache.put("prompt", window, "старый ответ")
+    assert cache.get("prompt", window.replace("слово3 ", "слова3 ", 1), max_new_words=MAX_NEW_WORDS) == "старый ответ"
+    assert cache.get("prompt", f"{window} {question}") == "старый ответ"  # Без max_new_words - похожее окно
+    assert cache.get("prompt", f"{window} {question}", max_new_words=MAX_NEW_WORDS) is None
+    assert cache.get("prompt", f"{window} {question}", similar=False) is None
+    print(f"OK ({cache.stats()})")
+
+# command to run: python src/llm_cache.py
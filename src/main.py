@@ -1,24 +1,58 @@
 import sys
 import os
+# Профайлер старта импортируется первым, чтобы замерить импорт всех остальных модулей
+from startup_profiler import profiler
+if "--profile-startup" in sys.argv:
+    profiler.start()
 from pathlib import Path
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                               QPushButton, QLabel, QHBoxLayout, QTextEdit, QSplitter)
-from PyQt6.QtCore import Qt, QTimer, QThread, pyqtSignal as Signal, QSize
+from PyQt6.QtCore import Qt, QTimer, QObject, pyqtSignal as Signal, QSize
 from PyQt6.QtGui import QShortcut, QKeySequence, QTextOption, QGuiApplication, QIcon
 import time
+import multiprocessing
 from datetime import datetime
-import markdown2
+import numpy as np
 
 from audio_recorder import AudioRecorder
 from wave_visualizer import WaveVisualizer
+from markdown_view import MarkdownView
 from file_manager import FileManager
-from functions import *
+from functions import (text_to_good_text, gt_to_answer, gt_to_answer_async, text_and_answer,
+                       improve_text_prompt, answer_prompt, combined_prompt)
+from vad import detect_speech
+from transcript_cache import (TranscriptCache, ChunkTranscript, OVERLAP_SECONDS,
+                              chunk_digest, segments_from_verbose)
+from chunk_store import ChunkStore
+from audio_encoder import encode_audio
+from clients import warm_up, preload
+from llm_cache import LLMCache, MAX_NEW_WORDS
+from question_detector import QuestionDetector
+from pipeline import Pipeline, Stage, Job
+from utterance_scheduler import UtteranceScheduler
+from transcription import create_engine
+from tracing import tracer
+from prompt_context import system_prefix
 
 # Конфигурация приложения
-CHUNK_INTERVAL = 10000  # Интервал сохранения чанков (10000=10 секунд)
-PROCESS_INTERVAL = 10000  # Интервал обработки чата (10 секунд)
-MAX_CHUNKS = 7 # Максимальное количество чанков для обработки
+SCHEDULER_INTERVAL = 20  # Как часто планировщик проверяет уровень звука (мс), границы чанков - в utterance_scheduler.py
+MAX_CHUNKS = 20 # Максимальное количество чанков для обработки
+WINDOW_SECONDS = 70  # Максимальная длительность окна обработки (секунды)
+MIN_SPEECH_RATIO = 0.1  # Чанки с меньшей долей речи считаются тишиной и не сохраняются
+TRANSCRIPTION_ENGINE = "openai"  # "openai" - Whisper API, "local" - faster-whisper на CPU (см. transcription.py)
+SESSION_FORMAT = "chunks"  # Хранение аудио чата: "chunks" - chunk_K.wav, "pcm" - один session.pcm с индексом
+UPLOAD_FORMAT = "flac"  # Формат загрузки в Whisper: "wav", "flac" (без потерь) или "opus"
+OPUS_BITRATE = 24000  # Битрейт для UPLOAD_FORMAT = "opus" (бит/с)
+STREAM_ANSWERS = True  # Показывать подсказку по мере генерации
+LLM_PROVIDERS = ("gpt", "claude")  # Провайдеры по приоритету: "gpt", "claude", "grok"
+PIPELINE_MODE = "serial"  # "serial" - улучшение, затем ответ; "merged" - оба одним запросом;
+                          # "speculative" - ответ по сырому тексту параллельно с улучшением
+HEDGE_AFTER_MS = 1500  # Если первый провайдер молчит дольше, дублируем запрос следующему (None - без дублей)
+STREAM_RENDER_INTERVAL = 150  # Как часто перерисовывать подсказку при потоковой генерации (мс)
 MARKDOWN_FONT_SIZE = 13  # Размер шрифта для markdown-текста
+SHOW_LATENCY_OVERLAY = False  # Показывать задержки стадий последнего цикла (переключается Ctrl+L)
+USE_CONTEXT = True  # Добавлять в системный промпт резюме, вакансию и инструкции из context/ (кешируется провайдером)
+STARTUP_BUDGET_MS = 1500  # python src/main.py --profile-startup: дольше до первой отрисовки - код выхода 1
 
 def resource_path(relative_path):
     """Возвращает абсолютный путь к ресурсу внутри .app или рядом с .py"""
@@ -29,79 +63,300 @@ def resource_path(relative_path):
         base_path = Path(__file__).parent
     return str(base_path / relative_path)
 
-class ChatProcessor(QThread):
+class ChatProcessor(QObject):
+    """Постоянный конвейер обработки: кодирование -> распознавание -> улучшение -> ответ.
+
+    Каждая стадия работает в своем потоке и берет задание, как только оно готово.
+    Более новое окно вытесняет старые задания (см. pipeline.py).
+    """
     finished = Signal(dict)  # Сигнал для передачи результата обработки
     text_ready = Signal(str)  # Новый сигнал для передачи распознанного текста
+    answer_partial = Signal(str)  # Сигнал с частично сгенерированной подсказкой
     
-    def __init__(self, chat_id):
+    def __init__(self, chunk_store, transcript_cache, llm_cache, question_detector):
         super().__init__()
-        self.chat_id = chat_id
-        self.start_time = time.time()
-        self.file_manager = FileManager()
+        self.file_manager = FileManager(SESSION_FORMAT)
+        self.chunk_store = chunk_store
+        self.transcript_cache = transcript_cache
+        self.llm_cache = llm_cache
+        self.question_detector = question_detector
         self.MIN_WORDS = 10  # Минимальное количество слов для обработки
+        self.transcriber = create_engine(TRANSCRIPTION_ENGINE)
+        self.transcriber.warm_up()  # Локальная модель загружается, пока пользователь не начал запись
+        # Файлы контекста читаются один раз: системный промпт одинаков во всех циклах,
+        # поэтому провайдер берет его из кеша и не обрабатывает заново каждые 10 секунд
+        self.improve_prep = system_prefix("improve") if USE_CONTEXT else ""
+        self.answer_prep = system_prefix("answer") if USE_CONTEXT else ""
+        self.pipeline = Pipeline([
+            Stage("encode", self.encode_stage, self.on_error),
+            # Распознанные чанки кешируются, поэтому распознавание не прерываем
+            Stage("transcribe", self.transcribe_stage, self.on_error, cancellable=False),
+            Stage("clean", self.clean_stage, self.on_error),
+            Stage("answer", self.answer_stage, self.on_error),
+        ])
+
+    def submit(self, chat_id, force=False, speech_end=None):
+        """Ставит в конвейер текущее окно чата. force - принудительное обновление: без пропусков и кеша"""
+        self.pipeline.submit(Job(chat_id, force, speech_end=speech_end))
+
+    def prefetch(self, chat_id):
+        """Заранее распознает новые чанки, пока реплика не закончилась"""
+        self.pipeline.submit(Job(chat_id, prefetch=True))
+
+    def stop(self):
+        self.pipeline.stop()
+        self.transcriber.stop()
         
-    def log_event(self, event_type, details):
-        """Логирует событие в файл"""
-        self.file_manager.current_chat = f"chat_{self.chat_id}"
-        self.file_manager.log_event(event_type, details)
+    def log_event(self, job, event_type, details, **fields):
+        """Логирует событие задания: номер цикла и стадия добавляются к полям записи"""
+        if job.prefetch:
+            fields["prefetch"] = True
+        self.file_manager.log_event(event_type, details, chat=f"chat_{job.chat_id}", cycle=job.generation,
+                                    stage=job.stage, **fields)
+
+    def emit_text(self, job, text):
+        # Вытесненное задание не должно перетирать текст более нового
+        if not job.cancelled.is_set():
+            self.text_ready.emit(text)
+
+    def on_partial(self, job):
+        if not STREAM_ANSWERS:
+            return None
+
+        def emit(text):
+            if not job.cancelled.is_set():
+                self.log_hint_latency(job)
+                self.answer_partial.emit(text)
+        return emit
+
+    def log_hint_latency(self, job):
+        """Логирует, сколько прошло от конца реплики до первой подсказки"""
+        if job.speech_end is not None:
+            latency = time.monotonic() - job.speech_end
+            job.speech_end = None
+            self.log_event(job, "Задержка подсказки", f"{latency * 1000:.0f} мс от конца речи",
+                           duration_ms=round(latency * 1000, 1))
+
+    def log_prompt_cache(self, job):
+        """Логирует по каждому запросу цикла, сколько токенов промпта взято из кеша и время до первого токена"""
+        for s in tracer.cycle_spans(job.generation, "llm."):
+            if "input_tokens" not in s.attrs:
+                continue
+            input_tokens, cached = s.attrs["input_tokens"], s.attrs.get("cached_tokens", 0)
+            ttft = s.attrs.get("ttft_ms")
+            self.log_event(job, "Кеш промпта", f"{s.name}: {cached} из {input_tokens} токенов из кеша, "
+                                               f"первый токен: {ttft if ttft is not None else '-'} мс",
+                           request=s.name, provider=s.attrs.get("provider"), input_tokens=input_tokens,
+                           cached_tokens=cached, ttft_ms=ttft)
+
+    def encode_stage(self, job):
+        """Определяет окно последних чанков и кодирует для Whisper те, которых нет в кеше"""
+        prev_chunk, chunks = self.chunk_store.window(job.chat_id, MAX_CHUNKS, WINDOW_SECONDS)
+        job.window = [chunk.num for chunk in chunks]
+        if not job.prefetch:
+            self.log_event(job, "Начало обработки", f"чанков: {self.chunk_store.count(job.chat_id)}")
         
-    def run(self):
-        try:
-            # 1. Объединяем чанки
-            N = count_chunks(self.chat_id)
-            self.log_event("Начало обработки", f"чанков: {N}")
-            
-            if not unite_chunks(self.chat_id, max(N-MAX_CHUNKS, 0), N, "temp/combined.wav"):
-                self.text_ready.emit("Ожидание накопления чанков...")
-                return
-                
-            # 2. Получаем расшифровку
-            raw_text = audio_to_text("temp/combined.wav")
-            if not raw_text:
-                self.text_ready.emit("Не удалось распознать аудио")
-                return
-                
-            self.log_event("Текст получен", f"Исходный текст: {raw_text}")
+        if not job.window:
+            if job.prefetch:
+                return False
+            self.emit_text(job, "Ожидание накопления чанков...")
+            return False
+
+        if not job.force and not job.prefetch and self.transcript_cache.is_processed(job.chat_id, job.window):
+            self.log_event(job, "Пропуск", "новых чанков нет")
+            return False
+
+        job.uploads = []
+        for chunk in chunks:
+            digest = chunk_digest(memoryview(chunk.samples).cast('B'))
+            if not self.transcript_cache.get(job.chat_id, chunk.num, digest):
+                job.uploads.append(self.encode_chunk(job, chunk, prev_chunk, digest))
+            prev_chunk = chunk
+        return bool(job.uploads) or not job.prefetch
+
+    def encode_chunk(self, job, chunk, prev_chunk, digest):
+        """Кодирует чанк с хвостом предыдущего, чтобы слова на стыке распознались целиком"""
+        buffers = [chunk.trimmed]
+        overlap = 0.0
+        if prev_chunk is not None:
+            tail = prev_chunk.trimmed[-int(OVERLAP_SECONDS * chunk.sample_rate):]
+            overlap = len(tail) / chunk.sample_rate
+            buffers.insert(0, tail)
+        duration = sum(len(buf) for buf in buffers) / chunk.sample_rate
+
+        upload_format = self.transcriber.upload_format or UPLOAD_FORMAT
+        encoded = encode_audio(buffers, chunk.sample_rate, f"chunk_{chunk.num}", upload_format, OPUS_BITRATE)
+        self.log_event(job, "Кодирование", f"{encoded.filename}: {encoded.raw_bytes} -> {len(encoded.data)} байт "
+                                           f"за {encoded.seconds * 1000:.0f} мс",
+                       chunk=chunk.num, duration_ms=round(encoded.seconds * 1000, 1), raw_bytes=encoded.raw_bytes,
+                       bytes=len(encoded.data), format=upload_format)
+        return chunk.num, digest, overlap, duration, encoded
+
+    def transcribe_stage(self, job):
+        """Распознает новые чанки и собирает расшифровку окна"""
+        transcribed = 0
+        for chunk_num, digest, overlap, duration, encoded in job.uploads:
+            if self.transcript_cache.get(job.chat_id, chunk_num, digest):
+                continue  # Уже распознан предыдущим заданием
+            result = self.transcriber.transcribe((encoded.filename, encoded.data), duration)
+            if result is None:
+                raise RuntimeError(f"не удалось распознать chunk_{chunk_num}")
+            rtf = self.transcriber.last_rtf or 0.0
+            self.log_event(job, "Распознавание", f"chunk_{chunk_num}: {self.transcriber.name}, "
+                                                 f"{self.transcriber.last_seconds * 1000:.0f} мс, RTF {rtf:.2f}",
+                           chunk=chunk_num, engine=self.transcriber.name, bytes=len(encoded.data),
+                           duration_ms=round(self.transcriber.last_seconds * 1000, 1),
+                           audio_seconds=round(duration, 3), rtf=round(rtf, 3))
+            segments = segments_from_verbose(result, duration)
+            self.transcript_cache.put(job.chat_id, chunk_num, ChunkTranscript(digest, segments, overlap, duration))
+            transcribed += 1
+        if job.prefetch:
+            # Остальное сделает задание, запущенное по концу реплики
+            self.log_event(job, "Распознано заранее", f"чанков: {transcribed}")
+            return False
+        self.log_event(job, "Распознано чанков", f"{transcribed} новых из {len(job.window)}")
+
+        raw_text = self.transcript_cache.assemble(job.chat_id, job.window)
+        if not raw_text:
+            self.emit_text(job, "Не удалось распознать аудио")
+            return False
             
-            # Проверяем количество слов
-            word_count = len(raw_text.split())
-            if word_count < self.MIN_WORDS:
-                self.text_ready.emit("Слушаем аудио...")
-                self.log_event("Текст слишком короткий", f"Слов: {word_count}, минимум: {self.MIN_WORDS}")
-                return
-                
-            # 3. Улучшаем текст
-            text = text_to_good_text(raw_text, improve_text_prompt)
-            if not text:
-                self.text_ready.emit("Не удалось обработать текст")
-                return
-                
-            self.log_event("Текст улучшен", f"Улучшенный текст: {text}")
-                
+        self.log_event(job, "Текст получен", f"Исходный текст: {raw_text}", text=raw_text)
+        
+        # Проверяем количество слов
+        word_count = len(raw_text.split())
+        if word_count < self.MIN_WORDS:
+            self.emit_text(job, "Слушаем аудио...")
+            self.log_event(job, "Текст слишком короткий", f"Слов: {word_count}, минимум: {self.MIN_WORDS}")
+            return False
+
+        job.raw_text = raw_text
+        return True
+
+    def clean_stage(self, job):
+        """Улучшает текст и проверяет, есть ли новый вопрос (в режиме merged - сразу с ответом).
+        Текст обновляется всегда, а ответ генерируется только на новый вопрос интервьюера"""
+        is_new_question, reason = self.question_detector.check(job.raw_text)
+        if job.force:
+            is_new_question, reason = True, "принудительное обновление"
+        self.log_event(job, "Новый вопрос" if is_new_question else "Вопрос не изменился", reason)
+
+        # Окно почти не изменилось с прошлого цикла - берем прошлый результат.
+        # Для нового вопроса - только точное совпадение: короткий вопрос в конце длинного
+        # окна почти не меняет его MinHash, и похожее окно вернуло бы старую подсказку
+        job.cycle_prompt = f"{PIPELINE_MODE}\n{improve_text_prompt}\n{answer_prompt}"
+        cached = None if job.force else self.llm_cache.get(job.cycle_prompt, job.raw_text, similar=not is_new_question)
+        if cached is not None:
+            job.text, job.answer = cached
+            self.log_event(job, "Кеш LLM", f"текст и ответ из кеша ({self.llm_cache.stats()})")
+            self.emit_text(job, job.text)
+            if is_new_question:
+                self.finish(job)
+            else:
+                self.transcript_cache.mark_processed(job.chat_id, job.window)
+            return False
+
+        job.start = time.perf_counter()
+        job.text_time = None
+        job.answer = None
+        job.answer_future = None
+
+        if not is_new_question:
+            # Интервьюер продолжает тот же вопрос: текст обновляем, подсказку оставляем прежней
+            self.improve_text(job)
+            self.transcript_cache.mark_processed(job.chat_id, job.window)
+            return False
+
+        if PIPELINE_MODE == "merged":
+            def on_text(text):
+                job.text_time = time.perf_counter() - job.start
+                self.log_event(job, "Текст улучшен", f"Улучшенный текст: {text}", text=text,
+                               duration_ms=round(job.text_time * 1000, 1))
+                self.emit_text(job, text)
+
+            job.text, job.answer = text_and_answer(job.raw_text, combined_prompt, on_text, self.on_partial(job),
+                                                   LLM_PROVIDERS, HEDGE_AFTER_MS, job.track, self.answer_prep)
+            job.check()
+            if job.text_time is None and job.text:
+                on_text(job.text)
+        else:
+            if PIPELINE_MODE == "speculative":
+                # Ответ по сырому тексту стартует, не дожидаясь улучшения
+                job.answer_future = job.track(gt_to_answer_async(job.raw_text, answer_prompt, self.on_partial(job),
+                                                                 LLM_PROVIDERS, HEDGE_AFTER_MS, self.answer_prep))
+            self.improve_text(job)
+
+        if not job.text:
+            if job.answer_future is not None:
+                job.answer_future.cancel()
+            self.emit_text(job, "Не удалось обработать текст")
+            return False
+        return True
+
+    def improve_text(self, job):
+        """Улучшает текст отдельным запросом и сразу отправляет его в интерфейс"""
+        job.text = text_to_good_text(job.raw_text, improve_text_prompt, LLM_PROVIDERS, HEDGE_AFTER_MS, job.track,
+                                     self.improve_prep)
+        job.text_time = time.perf_counter() - job.start
+        job.check()
+        if job.text:
+            self.log_event(job, "Текст улучшен", f"Улучшенный текст: {job.text}", text=job.text,
+                           duration_ms=round(job.text_time * 1000, 1))
             # Отправляем текст сразу после его обработки
-            self.text_ready.emit(text)
-            
-            # 4. Генерируем ответ
-            answer = gt_to_answer(text, answer_prompt)
-            
-            self.log_event("Ответ сгенерирован", f"Ответ: {answer}")
-            
-            # Отправляем результат с текстом и ответом
-            result = {
-                'text': text,
-                'answer': answer if answer else "Не удалось сгенерировать ответ"
-            }
-            self.finished.emit(result)
-                
-        except Exception as e:
-            error_msg = f"Ошибка обработки: {str(e)}"
-            print(error_msg)
-            self.log_event("Ошибка", error_msg)
-            self.text_ready.emit(error_msg)
-            self.finished.emit({
-                'text': error_msg,
-                'answer': "Не удалось сгенерировать ответ"
-            })
+            self.emit_text(job, job.text)
+
+    def answer_stage(self, job):
+        """Генерирует подсказку (если она еще не готова) и отдает результат"""
+        if job.answer_future is not None:
+            job.answer, _ = job.answer_future.result()
+        elif PIPELINE_MODE != "merged":
+            # После улучшения текст мог совпасть с уже отвеченным. Похожий текст подходит, только если
+            # в нем нет новых слов: дописанный в конец окна вопрос почти не меняет MinHash
+            job.answer = self.llm_cache.get(answer_prompt, job.text, max_new_words=MAX_NEW_WORDS)
+            if job.answer is None:
+                job.answer = gt_to_answer(job.text, answer_prompt, self.on_partial(job),
+                                          LLM_PROVIDERS, HEDGE_AFTER_MS, job.track, self.answer_prep)
+                if job.answer:
+                    self.llm_cache.put(answer_prompt, job.text, job.answer)
+        job.check()
+
+        total = time.perf_counter() - job.start
+        self.log_event(job, "Латентность LLM", f"режим: {PIPELINE_MODE}, текст: {(job.text_time or 0) * 1000:.0f} мс, "
+                                               f"текст и ответ: {total * 1000:.0f} мс",
+                       mode=PIPELINE_MODE, text_ms=round((job.text_time or 0) * 1000, 1),
+                       duration_ms=round(total * 1000, 1))
+        if job.answer:
+            self.llm_cache.put(job.cycle_prompt, job.raw_text, (job.text, job.answer))
+        self.log_event(job, "Кеш LLM", self.llm_cache.stats())
+        self.finish(job)
+        return True
+
+    def finish(self, job):
+        """Отправляет результат с текстом и ответом"""
+        self.log_hint_latency(job)
+        self.log_prompt_cache(job)
+        tracer.end_cycle(job.generation)
+        self.log_event(job, "Ответ сгенерирован", f"Ответ: {job.answer}", text=job.answer)
+        self.finished.emit({
+            'text': job.text,
+            'answer': job.answer if job.answer else "Не удалось сгенерировать ответ"
+        })
+        self.transcript_cache.mark_processed(job.chat_id, job.window)
+        if job.answer:
+            self.question_detector.mark_answered(job.raw_text)
+
+    def on_error(self, job, e):
+        error_msg = f"Ошибка обработки: {str(e)}"
+        print(error_msg)
+        self.log_event(job, "Ошибка", error_msg)
+        if job.prefetch or job.cancelled.is_set():
+            # Фоновое или вытесненное задание не должно затирать показанный текст и подсказку
+            return
+        self.emit_text(job, error_msg)
+        self.finished.emit({
+            'text': error_msg,
+            'answer': "Не удалось сгенерировать ответ"
+        })
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -121,25 +376,40 @@ class MainWindow(QMainWindow):
                 self.setStyleSheet(f.read())
         
         self.audio_recorder = AudioRecorder()
-        self.file_manager = FileManager()
-        self.chat_processor = None
+        self.file_manager = FileManager(SESSION_FORMAT)
+        self.chunk_store = ChunkStore()  # Чанки текущей сессии в памяти
+        self.transcript_cache = TranscriptCache()  # Расшифровки чанков между циклами обработки
+        self.llm_cache = LLMCache()  # Ответы LLM для неизменившегося окна
+        self.question_detector = QuestionDetector()  # Последний отвеченный вопрос
+        self.scheduler = UtteranceScheduler()  # Границы чанков и реплик по уровню звука
+        # Конвейер обработки живет все время работы приложения
+        self.chat_processor = ChatProcessor(self.chunk_store, self.transcript_cache, self.llm_cache,
+                                            self.question_detector)
+        self.chat_processor.text_ready.connect(self.on_text_ready)
+        self.chat_processor.answer_partial.connect(self.on_answer_partial)
+        self.chat_processor.finished.connect(self.on_chat_processed)
         self.is_fading = False  # Флаг затухания волны
+        self.is_clipping = False  # Флаг перегрузки микрофона
         
         self.init_ui()
         self.setup_hotkeys()
+
+        # Частичные подсказки копятся здесь и отрисовываются не чаще STREAM_RENDER_INTERVAL
+        self.pending_hint = None
+        self.exported_span = None  # Последний спан на момент export_trace
+        self.hint_timer = QTimer(self)
+        self.hint_timer.setSingleShot(True)
+        self.hint_timer.setInterval(STREAM_RENDER_INTERVAL)
+        self.hint_timer.timeout.connect(self.render_pending_hint)
         
         # Таймеры
         self.update_timer = QTimer(self)
+        self.update_timer.setInterval(16)  # 60 FPS, работает только во время записи и затухания волны
         self.update_timer.timeout.connect(self.update_visualization)
-        self.update_timer.start(16)  # 60 FPS
         
+        # Чанки закрываются на паузах, обработка запускается по концу реплики (см. check_boundary)
         self.chunk_timer = QTimer(self)
-        self.chunk_timer.timeout.connect(self.save_chunk)
-        self.chunk_timer.start(CHUNK_INTERVAL)  # Сохраняем чанки каждые CHUNK_INTERVAL мс
-        
-        self.process_timer = QTimer(self)
-        self.process_timer.timeout.connect(self.process_chat)
-        self.process_timer.start(PROCESS_INTERVAL)  # Обрабатываем чат каждые PROCESS_INTERVAL мс
+        self.chunk_timer.timeout.connect(self.check_boundary)
         
     def init_ui(self):
         central_widget = QWidget()
@@ -183,6 +453,13 @@ QPushButton:hover {
         status_layout.addWidget(self.record_btn)
         top_layout.addLayout(status_layout)
         
+        # Задержки стадий последнего цикла и p95 (см. tracing.py)
+        self.latency_label = QLabel()
+        self.latency_label.setStyleSheet("QLabel { color: gray; font-size: 11px; }")
+        self.show_latency = SHOW_LATENCY_OVERLAY
+        self.latency_label.setVisible(self.show_latency)
+        top_layout.addWidget(self.latency_label)
+        
         # Визуализация волн
         self.wave_visualizer = WaveVisualizer()
         self.wave_visualizer.setFixedHeight(80)  # Уменьшаем высоту визуализации
@@ -235,9 +512,55 @@ QPushButton:hover {
         
         copy_text_on_click(self.hints_edit)
         
+        # Markdown переводится в HTML в фоне, в документ вносятся только изменившиеся блоки
+        self.text_view = MarkdownView(self.text_edit, MARKDOWN_FONT_SIZE)
+        self.hints_view = MarkdownView(self.hints_edit, MARKDOWN_FONT_SIZE)
+        
     def setup_hotkeys(self):
         self.record_shortcut = QShortcut(QKeySequence(Qt.Key.Key_Space), self)
         self.record_shortcut.activated.connect(self.toggle_recording)
+        self.refresh_shortcut = QShortcut(QKeySequence("Ctrl+R"), self)
+        self.refresh_shortcut.activated.connect(self.force_refresh)
+        self.latency_shortcut = QShortcut(QKeySequence("Ctrl+L"), self)
+        self.latency_shortcut.activated.connect(self.toggle_latency_overlay)
+
+    def toggle_latency_overlay(self):
+        self.show_latency = not self.show_latency
+        self.latency_label.setVisible(self.show_latency)
+        self.update_latency_overlay()
+
+    def update_latency_overlay(self):
+        """Разбивка последнего цикла по стадиям и p95 каждой стадии"""
+        if not self.show_latency:
+            return
+        stages = {stage.name for stage in self.chat_processor.pipeline.stages}
+        breakdown, total = tracer.cycle_breakdown(names=stages)
+        if not breakdown:
+            self.latency_label.setText("Задержки: нет данных")
+            return
+        p95 = tracer.percentiles(95)
+        parts = [f"{name} {ms:.0f} (p95 {p95.get(name) or 0:.0f})" for name, ms in breakdown]
+        self.latency_label.setText(f"Цикл {total:.0f} мс: " + " · ".join(parts))
+
+    def export_trace(self):
+        """Сохраняет трассировку (Chrome trace) и сводку задержек рядом с логом чата"""
+        chat = self.file_manager.current_chat
+        if not chat or not tracer.spans or tracer.spans[-1] is self.exported_span:
+            return  # Нечего сохранять или с прошлого сохранения новых спанов нет
+        self.exported_span = tracer.spans[-1]
+        try:
+            base = os.path.join(self.file_manager.text_dir, chat)
+            tracer.export_chrome(f"{base}_trace.json")
+            tracer.export_json(f"{base}_latency.json")
+        except Exception as e:
+            print(f"Ошибка при сохранении трассировки: {str(e)}")
+
+    def force_refresh(self):
+        """Принудительно обновляет подсказку, даже если вопрос не изменился"""
+        if self.audio_recorder.is_recording:
+            self.store_chunk()  # Берем в окно все, что сказано к этому моменту
+            self.scheduler.reset(self.audio_recorder.clock())
+        self.process_chat(force=True)
         
     def toggle_recording(self):
         if not self.audio_recorder.is_recording:
@@ -248,13 +571,16 @@ QPushButton:hover {
     def start_recording(self):
         try:
             chat_dir = self.file_manager.create_chat_directory()
+            self.question_detector.reset()
             print(f"Создана директория для записи: {chat_dir}")
             
             self.audio_recorder.start_recording()
+            warm_up(LLM_PROVIDERS)  # Открываем соединения с API, пока копится первый чанк
             
             # Запускаем таймеры при старте записи
-            self.chunk_timer.start()
-            self.process_timer.start()
+            self.scheduler.reset(self.audio_recorder.clock())
+            self.chunk_timer.start(SCHEDULER_INTERVAL)
+            self.update_timer.start()
             
             self.record_btn.setText("⏹ Остановить запись (Space)")
             self.status_label.setText("Запись...")
@@ -274,15 +600,15 @@ QPushButton:hover {
         if self.audio_recorder.is_recording:
             # Останавливаем таймеры при остановке записи
             self.chunk_timer.stop()
-            self.process_timer.stop()
             
             # Сохраняем последний чанк перед остановкой
-            chunk_data = self.audio_recorder.save_chunk()
-            if chunk_data:
-                filepath = self.file_manager.save_audio_chunk(chunk_data)
+            filepath = self.store_chunk()
+            if filepath:
                 print(f"Сохранен последний чанк: {filepath}")
+                self.process_chat()
             
             self.audio_recorder.stop_recording()
+            self.export_trace()
             
             self.record_btn.setText("🎤 Начать запись (Space)")
             self.status_label.setText("Готов к записи")
@@ -294,60 +620,114 @@ QPushButton:hover {
             
     def update_visualization(self):
         if self.audio_recorder.is_recording:
-            level = self.audio_recorder.get_audio_level()
+            level = self.audio_recorder.get_level_snapshot()
             self.wave_visualizer.update_level(level)
             self.is_fading = False  # Сброс затухания, если снова пишем
+            if level.clipped != self.is_clipping:
+                self.is_clipping = level.clipped
+                self.status_label.setText("Запись... (перегрузка микрофона!)" if level.clipped else "Запись...")
         elif self.is_fading:
             # Постепенно затухаем: добавляем уровень, стремящийся к 0
             # Если все значения уже близки к 0 — останавливаем затухание
-            if hasattr(self.wave_visualizer, 'levels') and max(abs(l) for l in self.wave_visualizer.levels) < 0.01:
+            if np.abs(self.wave_visualizer.levels).max() < 0.01:
                 self.is_fading = False
             else:
                 self.wave_visualizer.update_level(0)
+        else:
+            # Ни записи, ни затухания: таймер не будит поток интерфейса до следующей записи
+            self.update_timer.stop()
             
-    def save_chunk(self):
-        if self.audio_recorder.is_recording:
-            chunk_data = self.audio_recorder.save_chunk()
-            if chunk_data:
-                filepath = self.file_manager.save_audio_chunk(chunk_data)
-                print(f"Сохранен чанк: {filepath}")
+    def check_boundary(self):
+        """Закрывает чанк на паузе и запускает обработку, когда собеседник договорил"""
+        if not self.audio_recorder.is_recording:
+            return
+        boundary = self.scheduler.update(self.audio_recorder.get_level_snapshot(), self.audio_recorder.clock())
+        if boundary is None:
+            return
+        if not boundary.has_speech:
+            self.audio_recorder.read_chunk()  # Одна тишина: только освобождаем буфер
+            filepath = None
+        else:
+            filepath = self.store_chunk()
+        if filepath:
+            print(f"Сохранен чанк: {filepath} ({boundary.reason})")
+        if boundary.end_of_utterance:
+            speech_end = boundary.speech_end
+            self.process_chat(speech_end=None if speech_end is None else self.audio_recorder.to_monotonic(speech_end))
+        elif filepath:
+            # Реплика продолжается: распознаем готовый чанк, не дожидаясь ее конца
+            self.chat_processor.prefetch(int(self.file_manager.current_chat.split('_')[1]))
+
+    def store_chunk(self):
+        """Забирает чанк из рекордера и сохраняет его, если в нем есть речь"""
+        audio_data = self.audio_recorder.read_chunk()
+        if audio_data is None:
+            return None
+
+        sample_rate = self.audio_recorder.sample_rate
+        speech = detect_speech(audio_data, sample_rate)
+        if speech.ratio < MIN_SPEECH_RATIO:
+            self.file_manager.log_event("Чанк пропущен", f"тишина, речь: {speech.ratio:.0%}")
+            return None
+
+        # Обработка читает чанк из памяти, запись на диск идет в фоне
+        chat_id = int(self.file_manager.current_chat.split('_')[1])
+        chunk_num = self.chunk_store.add(chat_id, audio_data, sample_rate, speech)
+        self.file_manager.save_audio_chunk_async(audio_data, sample_rate, chunk_num, speech)
+        if SESSION_FORMAT == "pcm":
+            return f"{self.file_manager.session().path} (chunk_{chunk_num})"
+        return self.file_manager.manifest().chunk_path(chunk_num)
             
-    def process_chat(self):
-        """Асинхронная обработка чата"""
+    def process_chat(self, force=False, speech_end=None):
+        """Ставит текущее окно чата в конвейер обработки. Более старые задания вытесняются"""
         if self.audio_recorder.is_recording and self.file_manager.current_chat:
-            # Если предыдущий процессор все еще работает, не запускаем новый
-            if self.chat_processor and self.chat_processor.isRunning():
-                print("Предыдущий процессор все еще работает, пропускаем...")
-                return
-                
             # Получаем ID текущего чата
             chat_id = int(self.file_manager.current_chat.split('_')[1])
-            
-            # Создаем и запускаем процессор в отдельном потоке
-            self.chat_processor = ChatProcessor(chat_id)
-            self.chat_processor.text_ready.connect(self.on_text_ready)  # Подключаем новый сигнал
-            self.chat_processor.finished.connect(self.on_chat_processed)
-            self.chat_processor.start()
+            self.chat_processor.submit(chat_id, force, speech_end)
             
     def on_text_ready(self, text):
         """Обработчик получения распознанного текста"""
         try:
-            set_markdown_with_code_wrap(self.text_edit, text, font_size=MARKDOWN_FONT_SIZE)
-            self.text_edit.verticalScrollBar().setValue(0)
+            self.text_view.set_markdown(text)
         except Exception as e:
             print(f"Ошибка при обновлении текста: {str(e)}")
             
+    def on_answer_partial(self, text):
+        """Обработчик частичной подсказки: запоминаем текст, отрисовку ограничивает таймер"""
+        self.pending_hint = text
+        if not self.hint_timer.isActive():
+            # Первый фрагмент показываем сразу, следующие - не чаще STREAM_RENDER_INTERVAL
+            self.render_pending_hint()
+
+    def render_pending_hint(self):
+        """Отрисовывает последнюю накопленную частичную подсказку. После каждой отрисовки
+        таймер запускается заново: следующая будет не раньше чем через STREAM_RENDER_INTERVAL"""
+        if self.pending_hint is None:
+            return
+        try:
+            self.hints_view.set_markdown(self.pending_hint)
+        except Exception as e:
+            print(f"Ошибка при обновлении ответа: {str(e)}")
+        self.pending_hint = None
+        self.hint_timer.start()
+
     def on_chat_processed(self, result):
         """Обработчик завершения обработки чата"""
+        # Финальный ответ заменяет все недорисованные частичные
+        self.hint_timer.stop()
+        self.pending_hint = None
         try:
             if result.get('answer'):
-                set_markdown_with_code_wrap(self.hints_edit, result['answer'], font_size=MARKDOWN_FONT_SIZE)
-                self.hints_edit.verticalScrollBar().setValue(0)
+                self.hints_view.set_markdown(result['answer'])
         except Exception as e:
             print(f"Ошибка при обновлении ответа: {str(e)}")
+        self.update_latency_overlay()
     
     def closeEvent(self, event):
         self.stop_recording()
+        self.chat_processor.stop()
+        self.export_trace()  # Спаны последнего цикла, завершенного после остановки записи
+        self.file_manager.close()  # Дописываем чанки и лог из очередей на диск
         event.accept()
 
 def copy_text_on_click(edit):
@@ -355,57 +735,13 @@ def copy_text_on_click(edit):
         QGuiApplication.clipboard().setText(edit.toPlainText())
     edit.mousePressEvent = handler
 
-def set_markdown_with_code_wrap(edit, text, font_size=MARKDOWN_FONT_SIZE):
-    # Преобразуем markdown в html
-    html = markdown2.markdown(text, extras=["fenced-code-blocks"])
-    # Добавим стили для кода и текста с параметром font_size
-    style = f"""
-    <style>
-    /* Базовые стили для всего текста */
-    body, p, ul, ol, li, h1, h2, h3, h4, h5, h6 {{
-        font-size: {font_size}px;  /* Размер шрифта для всего текста */
-        margin: 0;                 /* Убираем внешние отступы */
-        padding: 0;                /* Убираем внутренние отступы */
-    }}
-
-    /* Стили для списков (маркированных и нумерованных) */
-    ul, ol {{
-        margin-left: 0;            /* Убираем внешний отступ слева */
-        padding-left: 0;           /* Убираем внутренний отступ слева */
-        list-style-position: inside; /* Маркеры внутри блока, а не снаружи */
-        margin-top: 0;
-        margin-bottom: 0.1em;
-    }}
-
-    /* Стили для элементов списка */
-    li {{
-        margin-bottom: 0.1em;      /* Отступ между элементами списка */
-    }}
-
-    /* Стили для параграфов */
-    p {{
-        margin-bottom: 0.2em;      /* Отступ между параграфами */
-    }}
-
-    /* Стили для блоков кода и инлайн-кода */
-    pre, code {{
-        background: #e6ecf1;       /* Светло-серый фон для кода */
-        color: #222;               /* Цвет текста кода */
-        border-radius: 6px;        /* Скругление углов блока кода */
-        font-family: 'JetBrains Mono', 'Fira Mono', 'Consolas', 'Menlo', monospace;  /* Моноширинные шрифты для кода */
-        font-size: {font_size}px;  /* Размер шрифта кода */
-        padding: 8px;              /* Внутренний отступ блока кода */
-        word-break: break-all;     /* Разрешаем перенос слов в любом месте */
-        white-space: pre-wrap;     /* Сохраняем пробелы и переносы, но разрешаем перенос строк */
-        display: block;            /* Блочное отображение */
-        margin: 0.2em 0;           /* Отступы сверху и снизу блока кода */
-    }}
-    </style>
-    """
-    edit.setHtml(style + html)
-
 # Основной код приложения
 if __name__ == '__main__':
+    # Процесс локальной модели распознавания запускается через spawn, в том числе из сборки PyInstaller
+    multiprocessing.freeze_support()
+
+    profiler.mark("Импорт модулей")
+
     # 1. Создаем экземпляр QApplication - это обязательный первый шаг для любого Qt приложения
     # sys.argv содержит аргументы командной строки, которые передаются в приложение
     app = QApplication(sys.argv)
@@ -413,9 +749,24 @@ if __name__ == '__main__':
     # 2. Создаем главное окно приложения
     # MainWindow содержит всю логику интерфейса и обработки аудио
     window = MainWindow()
+    profiler.mark("Окно создано")
     
     # 3. Показываем окно на экране
     window.show()
+
+    def on_first_paint(elapsed):
+        # SDK провайдеров и markdown2 загружаются в фоне, когда окно уже на экране
+        preload()
+        if profiler.enabled:
+            profiler.stop()
+            print(profiler.report())
+            os.makedirs("logs", exist_ok=True)
+            print(f"Профиль старта сохранен: {profiler.save('logs/startup_profile.json')}")
+            if elapsed > STARTUP_BUDGET_MS:
+                print(f"Первая отрисовка через {elapsed:.0f} мс, бюджет {STARTUP_BUDGET_MS} мс")
+            QTimer.singleShot(0, lambda: app.exit(1 if elapsed > STARTUP_BUDGET_MS else 0))
+
+    profiler.on_first_paint(window, on_first_paint)
     
     # 4. Запускаем главный цикл обработки событий приложения
     # app.exec() будет работать, пока приложение не будет закрыто
@@ -443,4 +794,6 @@ if __name__ == '__main__':
 # 5. WaveVisualizer - класс для визуализации аудио
 #    - Показывает уровень звука в реальном времени
 
+# Профиль старта (импорты и время до первой отрисовки): python src/main.py --profile-startup
+
 # command to run: python src/main.py
\ No newline at end of file
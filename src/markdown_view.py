@@ -0,0 +1,227 @@
+import re
+import time
+import queue
+import threading
+from functools import lru_cache
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal as Signal
+from PyQt6.QtGui import QTextCursor, QTextDocumentFragment
+
+RENDER_BUDGET_MS = 8  # Сколько времени потока интерфейса можно потратить на обновление за один проход
+
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_LIST_ITEM = re.compile(r"^\s*([-*+]|\d+[.)])\s")
+_ZWSP = "\u200b"  # Пробел нулевой ширины
+
+
+@lru_cache(maxsize=8)
+def document_stylesheet(font_size):
+    """Стили markdown-текста. Задаются документу один раз (setDefaultStyleSheet), а не в каждом HTML"""
+    return f"""
+    /* Базовые стили для всего текста */
+    body, p, ul, ol, li, h1, h2, h3, h4, h5, h6 {{
+        font-size: {font_size}px;  /* Размер шрифта для всего текста */
+        margin: 0;                 /* Убираем внешние отступы */
+        padding: 0;                /* Убираем внутренние отступы */
+    }}
+
+    /* Стили для списков (маркированных и нумерованных) */
+    ul, ol {{
+        margin-left: 0;            /* Убираем внешний отступ слева */
+        padding-left: 0;           /* Убираем внутренний отступ слева */
+        list-style-position: inside; /* Маркеры внутри блока, а не снаружи */
+        margin-top: 0;
+        margin-bottom: 0.1em;
+    }}
+
+    /* Стили для элементов списка */
+    li {{
+        margin-bottom: 0.1em;      /* Отступ между элементами списка */
+    }}
+
+    /* Стили для параграфов */
+    p {{
+        margin-bottom: 0.2em;      /* Отступ между параграфами */
+    }}
+
+    /* Стили для блоков кода и инлайн-кода */
+    pre, code {{
+        background: #e6ecf1;       /* Светло-серый фон для кода */
+        color: #222;               /* Цвет текста кода */
+        border-radius: 6px;        /* Скругление углов блока кода */
+        font-family: 'JetBrains Mono', 'Fira Mono', 'Consolas', 'Menlo', monospace;  /* Моноширинные шрифты для кода */
+        font-size: {font_size}px;  /* Размер шрифта кода */
+        padding: 8px;              /* Внутренний отступ блока кода */
+        word-break: break-all;     /* Разрешаем перенос слов в любом месте */
+        white-space: pre-wrap;     /* Сохраняем пробелы и переносы, но разрешаем перенос строк */
+        display: block;            /* Блочное отображение */
+        margin: 0.2em 0;           /* Отступы сверху и снизу блока кода */
+    }}
+    """
+
+
+def split_blocks(text):
+    """Делит markdown на блоки верхнего уровня по пустым строкам. Блок кода и список
+    (с пунктами через пустую строку) остаются одним блоком"""
+    blocks, current, in_fence, blank = [], [], False, False
+    for line in text.split("\n"):
+        if _FENCE.match(line):
+            if not in_fence and blank and current:
+                blocks.append(current)
+                current = []
+            in_fence = not in_fence
+            blank = False
+        elif not in_fence and not line.strip():
+            blank = bool(current)
+            if current:
+                current.append(line)
+            continue
+        elif blank and not _continues_list(current, line):
+            blocks.append(current)
+            current = []
+        blank = False
+        current.append(line)
+    if current:
+        blocks.append(current)
+    return ["\n".join(block).strip("\n") for block in blocks]
+
+
+def _continues_list(block, line):
+    """Строка после пустой продолжает список: следующий пункт или текст пункта с отступом"""
+    last = next((prev for prev in reversed(block) if prev.strip()), "")
+    in_list = bool(_LIST_ITEM.match(last)) or (last[:1].isspace() and any(map(_LIST_ITEM.match, block)))
+    return in_list and (bool(_LIST_ITEM.match(line)) or line[:1].isspace())
+
+
+@lru_cache(maxsize=256)
+def block_html(block):
+    """HTML одного блока. При потоковой генерации меняется только последний блок,
+    остальные берутся из кеша"""
+    import markdown2  # Загружается в потоке рендеринга, а не при старте приложения
+    return markdown2.markdown(block, extras=["fenced-code-blocks"]).strip()
+
+
+class _RenderWorker:
+    """Поток, который переводит markdown в HTML. Для каждого окна важен только
+    последний запрошенный текст, промежуточные пропускаются"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="markdown", daemon=True)
+        self.thread.start()
+
+    def submit(self, view, generation, text):
+        self.queue.put((view, generation, text))
+
+    def _run(self):
+        while True:
+            latest = {}
+            view, generation, text = self.queue.get()
+            latest[view] = (generation, text)
+            while True:
+                try:
+                    view, generation, text = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                latest[view] = (generation, text)
+            for view, (generation, text) in latest.items():
+                try:
+                    view.ready.emit(generation, [block_html(block) for block in split_blocks(text)])
+                except Exception as e:
+                    print(f"Ошибка при обработке markdown: {str(e)}")
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _get_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = _RenderWorker()
+        return _worker
+
+
+class MarkdownView(QObject):
+    """Показывает markdown в QTextEdit без долгих остановок потока интерфейса.
+
+    HTML строится в фоновом потоке. В документ вносятся только изменившиеся блоки:
+    общее начало с прошлым текстом остается как есть, хвост заменяется. Вставка идет
+    частями не дольше RENDER_BUDGET_MS за проход. Позиция прокрутки сохраняется,
+    если не изменился первый блок (новый текст показывается с начала).
+    """
+    ready = Signal(int, object)  # Номер запроса и HTML блоков, из потока рендеринга
+
+    def __init__(self, edit, font_size):
+        super().__init__(edit)
+        self.edit = edit
+        self.document = edit.document()
+        self.document.setDefaultStyleSheet(document_stylesheet(font_size))
+        self.generation = 0
+        self.blocks = []  # HTML блоков, которые уже в документе
+        self.ends = []  # Позиция конца каждого блока в документе
+        self.pending = []  # Блоки, которые осталось вставить
+        self.scroll = None  # Позиция прокрутки, которую нужно вернуть после вставки
+        self.apply_timer = QTimer(self)
+        self.apply_timer.setSingleShot(True)
+        self.apply_timer.timeout.connect(self.apply_pending)
+        self.ready.connect(self.on_ready)
+
+    def set_markdown(self, text):
+        """Запрашивает отрисовку текста. Более поздний запрос отменяет более ранние"""
+        self.generation += 1
+        _get_worker().submit(self, self.generation, text)
+
+    def on_ready(self, generation, blocks):
+        if generation != self.generation:
+            return  # Уже запрошен более новый текст
+        common = 0
+        while common < min(len(blocks), len(self.blocks)) and blocks[common] == self.blocks[common]:
+            common += 1
+        scrollbar = self.edit.verticalScrollBar()
+        self.scroll = scrollbar.value() if common > 0 else 0
+        if common == len(blocks) == len(self.blocks):
+            self.pending = []
+            return
+        self.truncate(common)
+        self.pending = blocks[common:]
+        self.apply_pending()
+
+    def truncate(self, count):
+        """Удаляет из документа все блоки после первых count"""
+        if count == 0:
+            self.document.clear()
+        else:
+            cursor = QTextCursor(self.document)
+            cursor.setPosition(self.ends[count - 1])
+            cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+            cursor.removeSelectedText()
+        del self.blocks[count:]
+        del self.ends[count:]
+
+    def apply_pending(self):
+        """Вставляет ожидающие блоки, пока не истек RENDER_BUDGET_MS; остальное - в следующем проходе"""
+        deadline = time.perf_counter() + RENDER_BUDGET_MS / 1000
+        cursor = QTextCursor(self.document)
+        while self.pending:
+            html = self.pending.pop(0)
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            position = cursor.position()
+            if self.blocks:
+                # Первый абзац фрагмента сливается с текущим и теряет свое оформление,
+                # поэтому в начало ставим невидимый символ и потом удаляем его
+                cursor.insertFragment(QTextDocumentFragment.fromHtml(_ZWSP + html, self.document))
+                marker = QTextCursor(self.document)
+                marker.setPosition(position)
+                marker.deleteChar()
+            else:
+                cursor.insertFragment(QTextDocumentFragment.fromHtml(html, self.document))
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            self.blocks.append(html)
+            self.ends.append(cursor.position())
+            if time.perf_counter() > deadline:
+                break
+        self.edit.verticalScrollBar().setValue(self.scroll or 0)
+        if self.pending:
+            self.apply_timer.start(0)
@@ -0,0 +1,283 @@
+import io
+import re
+import json
+import time
+import wave
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Задержка до первого байта ответа по умолчанию: (среднее, разброс) в миллисекундах
+DEFAULT_LATENCY = {
+    "whisper": (400, 150),
+    "openai": (500, 200),
+    "anthropic": (600, 250),
+    "grok": (500, 200),
+}
+TOKEN_INTERVAL_MS = 15  # Пауза между фрагментами потокового ответа
+WORDS_PER_SECOND = 2.5  # Темп речи, по которому подбирается текст расшифровки
+CACHE_MIN_TOKENS = 1024  # Префикс короче не кешируется (порог OpenAI и Anthropic)
+
+# Текст, который «произносится» в записи, если расшифровка не задана
+DEFAULT_TRANSCRIPT = (
+    "Расскажи, как ты подключался к базе данных из Python. "
+    "Представь, что у нас есть датафрейм с возрастом пользователя и суммой покупок. "
+    "Как ты проверишь гипотезу, что сумма зависит от возраста? "
+    "Какой статистический критерий ты выберешь и почему? "
+    "Что будешь делать, если распределение сильно отличается от нормального? "
+    "Как объяснишь результат бизнесу?"
+)
+
+ANSWER = (
+    "**Основной вопрос:** проверка зависимости суммы покупок от возраста.\n\n"
+    "- Посмотреть на данные: `df.describe()`, scatter plot\n"
+    "- Корреляция Пирсона или Спирмена: `scipy.stats.spearmanr`\n"
+    "- Разбить на возрастные группы и сравнить: Манн-Уитни или Краскел-Уоллис\n"
+    "- Проверить значимость и размер эффекта, объяснить бизнесу на языке денег"
+)
+
+
+class MockAPI:
+    """Локальная замена API OpenAI, Anthropic и Grok для бенчмарков без сети.
+
+    Отвечает теми же форматами (verbose_json, SSE потоки) с настраиваемой задержкой
+    первого байта и разбросом. Случайность с фиксированным seed - прогоны воспроизводимы.
+    """
+
+    def __init__(self, latency=None, token_interval_ms=TOKEN_INTERVAL_MS, transcript=DEFAULT_TRANSCRIPT,
+                 seed=0, port=0):
+        self.latency = dict(DEFAULT_LATENCY, **(latency or {}))
+        self.token_interval = token_interval_ms / 1000
+        self.words = transcript.split()
+        self.position = 0  # Сколько слов расшифровки уже «произнесено»
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}  # Сколько запросов пришло на каждый API
+        self.prefixes = set()  # Системные промпты, уже попавшие в «кеш провайдера»
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="mock-api", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self, api):
+        """Ждет задержку первого байта для api"""
+        mean, jitter = self.latency[api]
+        with self.lock:
+            self.requests[api] = self.requests.get(api, 0) + 1
+            value = self.random.gauss(mean, jitter / 2) if jitter else mean
+        time.sleep(max(value, 0) / 1000)
+
+    def next_words(self, duration):
+        """Следующие слова расшифровки на duration секунд речи (по кругу)"""
+        count = max(int(round(duration * WORDS_PER_SECOND)), 1)
+        with self.lock:
+            words = [self.words[(self.position + i) % len(self.words)] for i in range(count)]
+            self.position += count
+        return words
+
+    def transcription(self, body):
+        duration = _wav_duration(body)
+        # Слова равномерно распределены по аудио, последняя секунда (хвост в следующем чанке) - без слов
+        words = self.next_words(max(duration - 1.0, 0.5))
+        step = max(duration - 1.0, 0.5) / len(words)
+        return {
+            "text": " ".join(words),
+            "duration": duration,
+            "language": "russian",
+            "segments": [{"id": 0, "start": 0.0, "end": step * len(words), "text": " " + " ".join(words)}],
+            "words": [{"word": word, "start": i * step, "end": (i + 1) * step} for i, word in enumerate(words)],
+        }
+
+    def answer(self, prompt):
+        """Ответ на запрос к LLM: для комбинированного промпта - оба раздела"""
+        text = re.sub(r"\s+", " ", prompt)[-300:].strip()
+        if "### ТЕКСТ" in prompt:
+            return f"### ТЕКСТ\n{text}\n\n### ПОДСКАЗКА\n{ANSWER}"
+        if "Заново напиши текст" in prompt or "переписать текст" in prompt:
+            return text
+        return ANSWER
+
+    @staticmethod
+    def usage(messages, answer):
+        """Оценка расхода токенов (около четырех символов на токен)"""
+        prompt = sum(len(message["content"]) for message in messages if isinstance(message["content"], str))
+        return prompt // 4 + 1, len(answer) // 4 + 1
+
+    def prompt_cache(self, blocks):
+        """Кеш префикса промпта: (токенов прочитано из кеша, токенов записано в кеш).
+        Кешируется каждый префикс из целых блоков не короче CACHE_MIN_TOKENS, как у провайдеров"""
+        cached = written = 0
+        with self.lock:
+            for i in range(len(blocks)):
+                prefix = "\n\n".join(blocks[:i + 1])
+                tokens = len(prefix) // 4
+                if prefix in self.prefixes:
+                    cached = tokens
+                elif tokens >= CACHE_MIN_TOKENS:
+                    self.prefixes.add(prefix)
+                    written = tokens - cached
+        return cached, written
+
+    def chunks(self, text):
+        """Фрагменты потокового ответа (по несколько слов)"""
+        words = re.findall(r"\S+\s*", text)
+        for i in range(0, len(words), 3):
+            yield "".join(words[i:i + 3])
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _json(self, data, status=200):
+                payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, events):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for event in events:
+                    data = event.encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+                    time.sleep(api.token_interval)
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def do_HEAD(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                self._json({"data": []})
+
+            def do_POST(self):
+                body = self._body()
+                path = self.path.split("?")[0]
+                if path.endswith("/audio/transcriptions"):
+                    api.delay("whisper")
+                    self._json(api.transcription(body))
+                elif path.endswith("/chat/completions"):
+                    request = json.loads(body)
+                    name = "grok" if request.get("model", "").startswith("grok") else "openai"
+                    api.delay(name)
+                    answer = api.answer(request["messages"][-1]["content"])
+                    if not request.get("stream"):
+                        self._json({"id": "mock", "object": "chat.completion", "created": int(time.time()),
+                                    "model": request.get("model"),
+                                    "choices": [{"index": 0, "finish_reason": "stop",
+                                                 "message": {"role": "assistant", "content": answer}}]})
+                        return
+                    self._stream(self._openai_events(request, answer))
+                elif path.endswith("/messages"):
+                    request = json.loads(body)
+                    api.delay("anthropic")
+                    answer = api.answer(request["messages"][-1]["content"])
+                    if not request.get("stream"):
+                        self._json({"id": "mock", "type": "message", "role": "assistant", "model": request["model"],
+                                    "content": [{"type": "text", "text": answer}], "stop_reason": "end_turn",
+                                    "usage": {"input_tokens": 0, "output_tokens": 0}})
+                        return
+                    self._stream(self._anthropic_events(request, answer))
+                else:
+                    self._json({"error": {"message": f"unknown endpoint {path}"}}, 404)
+
+            @staticmethod
+            def _openai_events(request, answer):
+                for delta in api.chunks(answer):
+                    chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": request.get("model"),
+                             "choices": [{"index": 0, "delta": {"content": delta}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    input_tokens, output_tokens = api.usage(request["messages"], answer)
+                    system = [message["content"] for message in request["messages"][:1]
+                              if message["role"] == "system"]
+                    cached, _ = api.prompt_cache(system)
+                    chunk = {"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": request.get("model"), "choices": [],
+                             "usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens,
+                                       "total_tokens": input_tokens + output_tokens,
+                                       "prompt_tokens_details": {"cached_tokens": cached}}}
+                    yield f"data: {json.dumps(chunk)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            @staticmethod
+            def _anthropic_events(request, answer):
+                def event(name, data):
+                    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+                input_tokens, output_tokens = api.usage(request["messages"], answer)
+                system = request.get("system") or []
+                if isinstance(system, str):
+                    input_tokens += len(system) // 4
+                    cached = written = 0
+                else:
+                    # input_tokens у Anthropic - без кешированной части
+                    texts = [block["text"] for block in system]
+                    cached, written = api.prompt_cache(texts)
+                    input_tokens += len("\n\n".join(texts)) // 4 - cached - written
+                yield event("message_start", {"type": "message_start", "message": {
+                    "id": "mock", "type": "message", "role": "assistant", "model": request["model"], "content": [],
+                    "stop_reason": None, "stop_sequence": None,
+                    "usage": {"input_tokens": input_tokens, "output_tokens": 0,
+                              "cache_read_input_tokens": cached, "cache_creation_input_tokens": written}}})
+                yield event("content_block_start", {"type": "content_block_start", "index": 0,
+                                                    "content_block": {"type": "text", "text": ""}})
+                for delta in api.chunks(answer):
+                    yield event("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                        "delta": {"type": "text_delta", "text": delta}})
+                yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+                yield event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn",
+                                                                                  "stop_sequence": None},
+                                              "usage": {"output_tokens": output_tokens}})
+                yield event("message_stop", {"type": "message_stop"})
+
+        return Handler
+
+
+def _wav_duration(body):
+    """Длительность WAV из multipart тела запроса (для других форматов - оценка по размеру)"""
+    start = body.find(b"RIFF")
+    if start >= 0:
+        try:
+            with wave.open(io.BytesIO(body[start:]), "rb") as w:
+                return w.getnframes() / w.getframerate()
+        except (wave.Error, EOFError):
+            pass
+    start = body.find(b"fLaC")
+    if start >= 0:
+        try:
+            import soundfile
+            return soundfile.info(io.BytesIO(body[start:])).duration
+        except Exception:
+            pass
+    return len(body) / 32000
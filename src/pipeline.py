@@ -0,0 +1,154 @@
+import queue
+import threading
+import itertools
+from concurrent.futures import CancelledError
+
+import tracing
+
+QUEUE_SIZE = 1  # Вместимость очереди перед стадией: ждет не больше одного задания
+
+
+class Superseded(Exception):
+    """Задание вытеснено более новым"""
+
+
+class Job:
+    """Задание конвейера: одно окно чата, проходящее по стадиям.
+
+    Стадии складывают промежуточные результаты в атрибуты задания.
+    prefetch - предварительное задание (например, распознать чанк, пока собеседник
+    еще говорит): оно не вытесняет обычные задания и само уступает любому новому.
+    """
+    _generations = itertools.count(1)
+
+    def __init__(self, chat_id, force=False, prefetch=False, speech_end=None):
+        self.generation = next(self._generations)
+        self.chat_id = chat_id
+        self.force = force
+        self.prefetch = prefetch
+        self.speech_end = speech_end  # Когда закончилась реплика (time.monotonic), для замера задержки
+        self.stage = None  # Стадия, на которой задание сейчас (для логов)
+        self.cancelled = threading.Event()
+        self.futures = []  # Запросы в полете, которые отменяются вместе с заданием
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled.set()
+            futures = list(self.futures)
+        for future in futures:
+            future.cancel()
+
+    def track(self, future):
+        """Регистрирует запрос задания, чтобы отменить его при вытеснении"""
+        with self.lock:
+            self.futures.append(future)
+            cancelled = self.cancelled.is_set()
+        if cancelled:
+            future.cancel()
+        return future
+
+    def check(self):
+        """Прерывает стадию, если задание уже вытеснено"""
+        if self.cancelled.is_set():
+            raise Superseded()
+
+
+class Stage:
+    """Стадия конвейера: свой поток и ограниченная очередь на входе.
+
+    handler(job) возвращает True, чтобы передать задание дальше. Новое задание вытесняет
+    старое, ожидающее в очереди, а на прерываемой стадии (cancellable) - и выполняющееся:
+    его запросы отменяются. Стадии, чей результат переиспользуется (например, распознавание
+    чанков с кешем), прерывать незачем.
+    """
+
+    def __init__(self, name, handler, on_error, cancellable=True):
+        self.name = name
+        self.handler = handler
+        self.on_error = on_error
+        self.cancellable = cancellable
+        self.next_stage = None
+        self.pipeline = None
+        self.current = None  # Задание, которое выполняется сейчас
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.thread = threading.Thread(target=self._run, name=f"stage-{name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, job):
+        current = self.current
+        if self.cancellable and not job.prefetch and current is not None and current.generation < job.generation:
+            current.cancel()
+        while True:
+            try:
+                self.queue.put_nowait(job)
+                return
+            except queue.Full:
+                try:
+                    old = self.queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if old is not None and old.generation < job.generation and (old.prefetch or not job.prefetch):
+                    old.cancel()
+                else:
+                    # В очереди более новое или обычное задание (или команда остановки) - оно важнее
+                    self.queue.put(old)
+                    return
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            if job.cancelled.is_set() or self.pipeline.is_stale(job):
+                continue
+            self.current = job
+            job.stage = self.name
+            tracing.set_cycle(job.generation)
+            try:
+                with tracing.span(self.name, prefetch=job.prefetch):
+                    passed = self.handler(job)
+            except (Superseded, CancelledError):
+                continue
+            except Exception as e:
+                self.on_error(job, e)
+                continue
+            finally:
+                self.current = None
+            if job.cancelled.is_set() or self.pipeline.is_stale(job):
+                continue
+            if passed and self.next_stage is not None:
+                self.next_stage.submit(job)
+
+    def stop(self):
+        """Останавливает поток стадии, выбрасывая ожидающее задание"""
+        try:
+            self.queue.get_nowait()
+        except queue.Empty:
+            pass
+        self.queue.put(None)
+
+
+class Pipeline:
+    """Цепочка стадий. Задание, у которого появилось более новое, дальше по цепочке не идет"""
+
+    def __init__(self, stages):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.next_stage = next_stage
+        for stage in stages:
+            stage.pipeline = self
+        self.latest = None
+
+    def submit(self, job):
+        if not job.prefetch:
+            self.latest = job
+        self.stages[0].submit(job)
+
+    def is_stale(self, job):
+        """Есть ли уже задание новее этого"""
+        return self.latest is not None and self.latest.generation > job.generation
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
@@ -0,0 +1,57 @@
+import os
+import threading
+
+# Описание кандидата, вакансия и инструкции для подсказок: папка context/ в корне репозитория
+CONTEXT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "context")
+CONTEXT_FILES = (
+    ("context.txt", "Кандидат (резюме и опыт)"),
+    ("vacancy.txt", "Вакансия"),
+)
+INSTRUCTIONS_FILE = "prompt.txt"  # Инструкции для подсказок: только в системном промпте ответа
+# Файл инструкций пишет пользователь, и его формат может расходиться с промптами в functions.py
+FORMAT_PRECEDENCE = ("Если в запросе задан формат ответа (пункты, разделы, длина), "
+                     "следуй формату из запроса: он важнее формата из инструкций выше.")
+
+_cache = {}
+_lock = threading.Lock()
+
+
+def _read(context_dir, name):
+    try:
+        with open(os.path.join(context_dir, name), encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def load_context(context_dir=CONTEXT_DIR):
+    """Читает файлы контекста один раз и собирает из них неизменные блоки системного промпта.
+
+    Возвращает (общий блок, инструкции подсказки). Общий блок одинаков для улучшения
+    текста и для ответа, поэтому провайдер кеширует его один раз на оба запроса
+    (см. system_prefix). Меняется только текст расшифровки в конце запроса.
+    """
+    with _lock:
+        if context_dir not in _cache:
+            sections = [f"## {title}\n\n{text}" for name, title in CONTEXT_FILES
+                        for text in [_read(context_dir, name)] if text]
+            shared = ""
+            if sections:
+                shared = ("Идет собеседование. Ниже - контекст, который нужен для всех запросов.\n\n"
+                          + "\n\n".join(sections))
+            instructions = _read(context_dir, INSTRUCTIONS_FILE)
+            if instructions:
+                instructions = f"{instructions}\n\n{FORMAT_PRECEDENCE}"
+            _cache[context_dir] = (shared, instructions)
+        return _cache[context_dir]
+
+
+def system_prefix(kind, context_dir=CONTEXT_DIR):
+    """Блоки системного промпта для запроса kind: "improve" (улучшение текста)
+    или "answer" (подсказка и комбинированный запрос). Порядок от самого общего
+    к частному: общий блок - префикс системного промпта ответа"""
+    shared, instructions = load_context(context_dir)
+    blocks = [shared] if shared else []
+    if kind == "answer" and instructions:
+        blocks.append(instructions)
+    return tuple(blocks)
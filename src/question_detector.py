@@ -0,0 +1,63 @@
+from difflib import SequenceMatcher
+
+from llm_cache import normalize
+
+MIN_NEW_WORDS = 4  # Меньше новых слов - вопрос не мог поменяться
+
+# Слова, с которых обычно начинается вопрос интервьюера
+QUESTION_WORDS = {
+    "как", "почему", "зачем", "что", "чем", "какой", "какая", "какое", "какие", "каким", "какую",
+    "где", "когда", "куда", "откуда", "сколько", "кто", "ли", "можешь", "можете", "могли",
+    "расскажи", "расскажите", "объясни", "объясните", "опиши", "опишите", "приведи", "приведите",
+    "представь", "представьте", "допустим", "давай", "давайте",
+}
+QUESTION_WORD_POSITION = 3  # Вопросительное слово должно стоять среди первых слов предложения
+
+
+class QuestionDetector:
+    """Решает, появился ли в окне расшифровки новый вопрос со времени последнего ответа.
+
+    Новую часть окна находит пословным диффом с последним отвеченным окном,
+    вопрос ищет по «?» и вопросительным словам в начале предложений.
+    """
+
+    def __init__(self):
+        self.answered_words = []  # Нормализованные слова последнего отвеченного окна
+
+    @staticmethod
+    def _tokens(text):
+        tokens = text.split()
+        return tokens, [normalize(token) for token in tokens]
+
+    def new_tokens(self, text):
+        """Слова окна, которых не было в последнем отвеченном окне"""
+        tokens, words = self._tokens(text)
+        matcher = SequenceMatcher(None, self.answered_words, words, autojunk=False)
+        return [tokens[j] for tag, _, _, j1, j2 in matcher.get_opcodes()
+                if tag in ("insert", "replace") for j in range(j1, j2)]
+
+    def check(self, text):
+        """Возвращает (есть ли новый вопрос, пояснение)"""
+        if not self.answered_words:
+            return True, "первое окно"
+
+        new = self.new_tokens(text)
+        if len([token for token in new if normalize(token)]) < MIN_NEW_WORDS:
+            return False, f"новых слов: {len(new)}"
+
+        if any(token.endswith("?") for token in new):
+            return True, "вопросительный знак"
+
+        position = 0  # Номер слова в текущем предложении
+        for token in new:
+            if position < QUESTION_WORD_POSITION and normalize(token) in QUESTION_WORDS:
+                return True, f"вопросительное слово «{token}»"
+            position = 0 if token[-1] in ".!?…" else position + 1
+        return False, f"новых слов: {len(new)}, признаков вопроса нет"
+
+    def mark_answered(self, text):
+        """Запоминает окно, на которое сгенерирован ответ"""
+        self.answered_words = self._tokens(text)[1]
+
+    def reset(self):
+        self.answered_words = []
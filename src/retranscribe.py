@@ -0,0 +1,33 @@
+import os
+
+from session_audio import SessionAudio
+from transcription import create_engine
+from functions import samples_to_wav
+
+# Повторное распознавание произвольного участка чата, записанного с SESSION_FORMAT = "pcm"
+
+chat_id = 1
+start = 0.0  # Начало участка (секунды записанного аудио)
+end = None  # Конец участка (None - до конца)
+engine = "openai"  # "openai" или "local"
+wav_file = "temp/range.wav"  # Куда сохранить участок (None - не сохранять)
+
+if __name__ == '__main__':
+    # Локальная модель запускается в отдельном процессе (spawn), поэтому код - под этой проверкой
+    session = SessionAudio(f"logs/audio/chat_{chat_id}")
+    samples = session.read(start, end)
+    print(f"Участок: {start:.1f}-{end if end is not None else session.duration():.1f} с, {len(samples)} сэмплов")
+
+    if wav_file:
+        os.makedirs(os.path.dirname(wav_file), exist_ok=True)
+        session.export_wav(wav_file, samples=samples)
+
+    transcriber = create_engine(engine)
+    result = transcriber.transcribe(("range.wav", samples_to_wav(samples, session.sample_rate, session.channels)),
+                                    len(samples) / session.sample_rate / session.channels)
+    if result is not None:
+        print(f"RTF: {transcriber.last_rtf:.2f}")
+        print(result.text)
+    transcriber.stop()
+
+# command to run: python src/retranscribe.py
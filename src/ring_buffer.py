@@ -0,0 +1,83 @@
+import numpy as np
+
+
+class RingBuffer:
+    """Кольцевой буфер фиксированного размера поверх заранее выделенного массива.
+
+    Рассчитан на одного писателя (callback аудио потока) и одного читателя
+    (GUI поток). Блокировки не нужны: писатель меняет только write_pos,
+    читатель - только read_pos, а позиции растут монотонно.
+    """
+
+    def __init__(self, capacity, dtype=np.int16):
+        self.capacity = int(capacity)
+        self.buffer = np.zeros(self.capacity, dtype=dtype)
+        self.write_pos = 0  # Сколько сэмплов записано за все время
+        self.read_pos = 0  # Начало непрочитанных данных
+        self.overflow_count = 0  # Сколько сэмплов потеряно из-за переполнения
+
+    def __len__(self):
+        """Количество непрочитанных сэмплов"""
+        return min(self.write_pos - self.read_pos, self.capacity)
+
+    def clear(self):
+        """Сбрасывает буфер без перевыделения памяти"""
+        self.write_pos = 0
+        self.read_pos = 0
+        self.overflow_count = 0
+
+    def write(self, samples):
+        """Записывает сэмплы в буфер (вызывается из callback аудио потока)"""
+        samples = np.asarray(samples).reshape(-1)
+        n = len(samples)
+        if n == 0:
+            return
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            self.write_pos += n - self.capacity
+            n = self.capacity
+
+        start = self.write_pos % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            self.buffer[start:end] = samples
+        else:
+            first = self.capacity - start
+            self.buffer[start:] = samples[:first]
+            self.buffer[:n - first] = samples[first:]
+        # Публикуем новые данные только после копирования
+        self.write_pos += n
+
+    def _copy(self, start, end):
+        """Копирует сэмплы в диапазоне абсолютных позиций [start, end)"""
+        n = end - start
+        if n <= 0:
+            return self.buffer[:0].copy()
+        i = start % self.capacity
+        j = i + n
+        if j <= self.capacity:
+            return self.buffer[i:j].copy()
+        return np.concatenate((self.buffer[i:], self.buffer[:j - self.capacity]))
+
+    def read(self):
+        """Забирает все непрочитанные сэмплы. Потерянные при переполнении сэмплы учитываются в overflow_count"""
+        end = self.write_pos
+        start = max(self.read_pos, end - self.capacity)
+        lost = start - self.read_pos
+        data = self._copy(start, end)
+
+        # Писатель мог успеть перезаписать начало диапазона, пока мы копировали
+        overwritten = self.write_pos - self.capacity - start
+        if overwritten > 0:
+            data = data[overwritten:]
+            lost += overwritten
+
+        self.read_pos = end
+        self.overflow_count += lost
+        return data
+
+    def latest(self, n):
+        """Возвращает копию последних n записанных сэмплов, не сдвигая позицию чтения"""
+        end = self.write_pos
+        start = max(end - min(n, self.capacity), 0)
+        return self._copy(start, end)
@@ -27,10 +27,14 @@ chat_id = 1
 def process_chat(chat_id):
     N = count_chunks(chat_id)
 
-    unite_chunks(1, N-5, N, wav_file)
+    os.makedirs(os.path.dirname(wav_file), exist_ok=True)
+    unite_chunks(chat_id, N-5, N, wav_file)
         
     # Получаем расшифровку
-    raw_text = audio_to_text(wav_file, api_key)
+    raw_text = audio_to_text(wav_file)
+    if not raw_text:
+        print("Не удалось распознать аудио")
+        return None
 
     text = text_to_good_text(raw_text, improve_text_prompt)
         
@@ -55,6 +59,9 @@ def process_chat(chat_id):
     return raw_text, text, answer
 
 
+if __name__ == '__main__':
+    process_chat(chat_id)
+
 # command to run: python src/script.py
 
 
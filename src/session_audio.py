@@ -0,0 +1,111 @@
+import os
+import json
+import mmap
+import wave
+import threading
+
+import numpy as np
+
+PCM_NAME = "session.pcm"  # Аудио всего чата подряд: int16, без заголовков
+META_NAME = "session.json"  # Частота и число каналов для session.pcm
+
+
+class SessionAudio:
+    """Аудио чата одним дописываемым файлом сырого PCM.
+
+    Положение каждого чанка (offset и size в байтах) хранится в index.tsv (см. ChunkManifest),
+    поэтому любой диапазон читается срезом memory-mapped файла, без открытия и разбора
+    отдельных WAV. Пишет один поток (FileManager), читать можно из любого.
+    """
+
+    def __init__(self, chat_dir, sample_rate=16000, channels=1):
+        self.path = os.path.join(chat_dir, PCM_NAME)
+        meta_path = os.path.join(chat_dir, META_NAME)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            sample_rate, channels = meta["sample_rate"], meta["channels"]
+        else:
+            os.makedirs(chat_dir, exist_ok=True)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"sample_rate": sample_rate, "channels": channels, "dtype": "int16"}, f)
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.frame_bytes = 2 * channels
+        self.file = None
+        self.map = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def exists(chat_dir):
+        return os.path.exists(os.path.join(chat_dir, PCM_NAME))
+
+    def append(self, samples):
+        """Дописывает сэмплы int16 в конец файла, возвращает смещение в байтах"""
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "ab")
+            offset = self.file.tell()
+            self.file.write(memoryview(np.ascontiguousarray(samples, dtype=np.int16)).cast('B'))
+            self.file.flush()
+        return offset
+
+    def size(self):
+        """Размер записанного аудио в байтах"""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def duration(self):
+        return self.size() / self.frame_bytes / self.sample_rate
+
+    def _mapped(self, end):
+        """Отображение файла в память, покрывающее байты до end (переоткрывается, когда файл вырос)"""
+        if self.map is None or len(self.map) < end:
+            if self.map is not None:
+                self.map.close()
+            with open(self.path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.map
+
+    def read_bytes(self, offset, size):
+        """Сэмплы диапазона байт как массив int16 (копия, отображение может смениться)"""
+        end = min(offset + size, self.size())
+        offset -= offset % self.frame_bytes
+        if end <= offset:
+            return np.zeros(0, dtype=np.int16)
+        with self.lock:
+            return np.frombuffer(self._mapped(end), dtype=np.int16, count=(end - offset) // 2,
+                                 offset=offset).copy()
+
+    def read(self, start=0.0, end=None):
+        """Сэмплы диапазона [start, end) в секундах от начала записанного аудио"""
+        start_byte = int(start * self.sample_rate) * self.frame_bytes
+        end_byte = self.size() if end is None else int(end * self.sample_rate) * self.frame_bytes
+        return self.read_bytes(start_byte, end_byte - start_byte)
+
+    def read_entries(self, entries):
+        """Сэмплы подряд идущих чанков из индекса (ManifestEntry) одним срезом"""
+        if not entries:
+            return np.zeros(0, dtype=np.int16)
+        return self.read_bytes(entries[0].offset, entries[-1].offset + entries[-1].size - entries[0].offset)
+
+    def export_wav(self, output_file, start=0.0, end=None, samples=None):
+        """Сохраняет диапазон (или готовые сэмплы) в WAV"""
+        samples = self.read(start, end) if samples is None else samples
+        with wave.open(output_file, 'wb') as w:
+            w.setnchannels(self.channels)
+            w.setsampwidth(2)
+            w.setframerate(self.sample_rate)
+            w.writeframes(samples.tobytes())
+        return output_file
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+            if self.map is not None:
+                self.map.close()
+                self.map = None
@@ -0,0 +1,135 @@
+import sys
+import json
+import time
+import threading
+
+# Профиль старта: время импорта каждого модуля (как python -X importtime, но работает
+# и в сборке PyInstaller) и отметки этапов до первой отрисовки окна.
+# Модуль не импортирует ничего тяжелого: он загружается раньше всех остальных.
+
+REPORT_TOP = 25  # Сколько самых долгих модулей показывать в отчете
+
+
+class _TimedLoader:
+    """Обертка загрузчика: замеряет create_module и exec_module, остальное передает исходному загрузчику"""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        # Модули-расширения (PyQt6, numpy) загружаются здесь, а не в exec_module
+        self._profiler._enter(spec.name)
+        try:
+            return self._loader.create_module(spec)
+        except BaseException:
+            self._profiler._exit()
+            raise
+
+    def exec_module(self, module):
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._exit()
+
+
+class StartupProfiler:
+    """Импорты и этапы старта. Замеры времени импорта включаются только start(),
+    отметки этапов (mark) пишутся всегда - это почти бесплатно"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.enabled = False
+        self.imports = []  # (модуль, собственное время, с вложенными импортами, глубина) в мс
+        self.marks = []  # (этап, мс от старта)
+        self._stack = []  # [модуль, начало, время вложенных импортов]
+
+    def start(self):
+        """Включает замер импортов: ставит себя первым в sys.meta_path"""
+        if not self.enabled:
+            self.enabled = True
+            sys.meta_path.insert(0, self)
+
+    def stop(self):
+        if self.enabled:
+            self.enabled = False
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path=None, target=None):
+        """Находит модуль остальными искателями и подменяет загрузчик на замеряющий"""
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self)
+                return spec
+        return None
+
+    def _enter(self, name):
+        # Импорты из фоновых потоков не считаем: они не задерживают появление окна
+        if threading.current_thread() is threading.main_thread():
+            self._stack.append([name, time.perf_counter(), 0.0])
+
+    def _exit(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        name, start, children = self._stack.pop()
+        total = (time.perf_counter() - start) * 1000
+        if self._stack:
+            self._stack[-1][2] += total
+        self.imports.append((name, total - children, total, len(self._stack)))
+
+    def mark(self, stage):
+        """Отмечает этап старта, возвращает мс от импорта профайлера"""
+        elapsed = (time.perf_counter() - self.origin) * 1000
+        self.marks.append((stage, elapsed))
+        return elapsed
+
+    def on_first_paint(self, widget, callback=None):
+        """Отмечает первую отрисовку widget и вызывает callback(мс от старта)"""
+        from PyQt6.QtCore import QObject, QEvent
+
+        profiler = self
+
+        class PaintFilter(QObject):
+            def eventFilter(self, obj, event):
+                if event.type() == QEvent.Type.Paint:
+                    widget.removeEventFilter(self)
+                    elapsed = profiler.mark("Первая отрисовка")
+                    if callback is not None:
+                        callback(elapsed)
+                return False
+
+        widget._first_paint_filter = PaintFilter(widget)  # Ссылка, чтобы фильтр не удалил сборщик мусора
+        widget.installEventFilter(widget._first_paint_filter)
+
+    def report(self, top=REPORT_TOP):
+        """Текстовый отчет: самые долгие импорты верхнего уровня и этапы старта"""
+        lines = [f"{'собств. мс':>11} | {'всего мс':>9} | модуль"]
+        roots = sorted((item for item in self.imports if item[3] == 0), key=lambda item: -item[2])
+        for name, own, total, depth in roots[:top]:
+            lines.append(f"{own:>11.1f} | {total:>9.1f} | {name}")
+        lines.append(f"Всего импортов: {len(self.imports)}, "
+                     f"{sum(item[2] for item in roots):.0f} мс на модули верхнего уровня")
+        previous = 0.0
+        for stage, elapsed in self.marks:
+            lines.append(f"{stage}: {elapsed:.0f} мс (+{elapsed - previous:.0f})")
+            previous = elapsed
+        return "\n".join(lines)
+
+    def save(self, path):
+        """Сохраняет замеры в JSON, чтобы сравнивать старт между версиями"""
+        data = {"marks": [{"stage": stage, "ms": round(elapsed, 1)} for stage, elapsed in self.marks],
+                "imports": [{"module": name, "self_ms": round(own, 2), "total_ms": round(total, 2), "depth": depth}
+                            for name, own, total, depth in self.imports]}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+
+profiler = StartupProfiler()
@@ -1,7 +1,11 @@
-from functions import text_to_good_text
+from functions import text_to_good_text, improve_text_prompt
 
+text = """
+Ты подключался к базе данных с помощью питона верно да именно так к какой базе данных к постгрес отлично
+представь что мы подключились и сделали коммит в результате чего у нас загрузился дата фрейм в пандас
+как мы можем быстро проверить гипотезу что сумма зависит от возраста
+"""
 
-
-print(text_to_good_text(text, prompt))
+print(text_to_good_text(text, improve_text_prompt))
 
 # command to run: python src/text_to_good_text.py
\ No newline at end of file
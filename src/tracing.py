@@ -0,0 +1,174 @@
+import json
+import time
+import threading
+from bisect import bisect_left
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+
+HISTOGRAM_SIZE = 200  # Сколько последних замеров каждой операции держать
+BUCKETS_MS = (50, 100, 200, 500, 1000, 2000, 5000, 10000)  # Границы корзин гистограммы
+MAX_SPANS = 5000  # Сколько спанов держать для экспорта
+MAX_CYCLES = 20  # Сколько последних циклов держать для разбивки
+
+_local = threading.local()
+
+
+class Span:
+    """Замер одной операции: время по time.perf_counter и произвольные счетчики (bytes, tokens...)"""
+    __slots__ = ('name', 'cycle', 'start', 'end', 'thread', 'attrs')
+
+    def __init__(self, name, cycle, attrs):
+        self.name = name
+        self.cycle = cycle
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread = threading.current_thread().name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+
+class RollingHistogram:
+    """Последние HISTOGRAM_SIZE длительностей операции"""
+
+    def __init__(self, size=HISTOGRAM_SIZE):
+        self.values = deque(maxlen=size)
+
+    def add(self, value):
+        self.values.append(value)
+
+    def percentile(self, q):
+        if not self.values:
+            return None
+        values = sorted(self.values)
+        return values[min(int(q / 100 * len(values)), len(values) - 1)]
+
+    def buckets(self):
+        """Количество замеров в корзинах BUCKETS_MS (последняя - все, что дольше)"""
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for value in self.values:
+            counts[bisect_left(BUCKETS_MS, value)] += 1
+        return counts
+
+
+class Tracer:
+    """Собирает спаны по циклам обработки и ведет скользящие гистограммы по операциям"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.spans = deque(maxlen=MAX_SPANS)
+        self.histograms = {}  # Имя операции -> RollingHistogram
+        self.cycles = OrderedDict()  # Номер цикла -> список спанов
+        self.last_cycle = None  # Последний завершенный цикл
+
+    @contextmanager
+    def span(self, name, cycle=None, **attrs):
+        """with tracer.span("transcribe", bytes=n) as s: ... - замеряет блок.
+        cycle по умолчанию - цикл текущего потока (см. set_cycle)"""
+        span = Span(name, cycle if cycle is not None else current_cycle(), attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span.attrs["error"] = type(e).__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            self._record(span)
+
+    def _record(self, span):
+        with self.lock:
+            self.spans.append(span)
+            self.histograms.setdefault(span.name, RollingHistogram()).add(span.duration_ms)
+            if span.cycle is not None:
+                self.cycles.setdefault(span.cycle, []).append(span)
+                while len(self.cycles) > MAX_CYCLES:
+                    self.cycles.popitem(last=False)
+
+    def end_cycle(self, cycle):
+        """Отмечает цикл завершенным (его разбивку показывает оверлей)"""
+        with self.lock:
+            if cycle in self.cycles:
+                self.last_cycle = cycle
+
+    def cycle_breakdown(self, cycle=None, names=None):
+        """[(операция, мс)] цикла по порядку начала (повторы операции суммируются)
+        и полная длительность цикла. names - показать только эти операции"""
+        with self.lock:
+            cycle = self.last_cycle if cycle is None else cycle
+            spans = list(self.cycles.get(cycle, []))
+        if not spans:
+            return [], 0.0
+        spans.sort(key=lambda span: span.start)
+        total = (max(span.end for span in spans) - spans[0].start) * 1000
+        breakdown = OrderedDict()
+        for span in spans:
+            if names is None or span.name in names:
+                breakdown[span.name] = breakdown.get(span.name, 0.0) + span.duration_ms
+        return list(breakdown.items()), total
+
+    def cycle_spans(self, cycle, prefix=""):
+        """Завершенные спаны цикла, имя которых начинается с prefix, по порядку начала"""
+        with self.lock:
+            spans = [span for span in self.cycles.get(cycle, []) if span.name.startswith(prefix)]
+        return sorted(spans, key=lambda span: span.start)
+
+    def percentiles(self, q=95):
+        with self.lock:
+            return {name: histogram.percentile(q) for name, histogram in self.histograms.items()}
+
+    def summary(self):
+        """Сводка по операциям: число замеров, p50, p95, корзины"""
+        with self.lock:
+            return {name: {"n": len(h.values), "p50": h.percentile(50), "p95": h.percentile(95),
+                           "buckets_ms": list(BUCKETS_MS), "counts": h.buckets()}
+                    for name, h in self.histograms.items()}
+
+    def export_chrome(self, path):
+        """Сохраняет спаны в формате Chrome trace (chrome://tracing, Perfetto)"""
+        with self.lock:
+            spans = list(self.spans)
+        threads = {}
+        events = []
+        for span in spans:
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            args = dict(span.attrs)
+            if span.cycle is not None:
+                args["cycle"] = span.cycle
+            events.append({"name": span.name, "ph": "X", "pid": 1, "tid": tid,
+                           "ts": round((span.start - self.origin) * 1e6), "dur": round(span.duration_ms * 1000),
+                           "args": args})
+        events.extend({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                      for name, tid in threads.items())
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False)
+        return path
+
+    def export_json(self, path):
+        """Сохраняет сводку по операциям и разбивку последних циклов"""
+        with self.lock:
+            cycles = list(self.cycles)
+        data = {"operations": self.summary(),
+                "cycles": {str(cycle): [{"name": name, "ms": round(ms, 1)} for name, ms in
+                                        self.cycle_breakdown(cycle)[0]] for cycle in cycles}}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+
+def set_cycle(cycle):
+    """Задает цикл, к которому относятся спаны текущего потока"""
+    _local.cycle = cycle
+
+
+def current_cycle():
+    return getattr(_local, "cycle", None)
+
+
+tracer = Tracer()
+span = tracer.span
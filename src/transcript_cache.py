@@ -0,0 +1,84 @@
+import hashlib
+from collections import namedtuple
+
+OVERLAP_SECONDS = 2.0  # Сколько секунд предыдущего чанка отправлять для контекста
+EDGE_SECONDS = 0.3  # Слова, заканчивающиеся ближе к границе чанка, берем из следующего чанка
+
+# segments - список (начало, конец, текст, слова), слова - (начало, конец, слово)
+# overlap - длина добавленного в начало хвоста предыдущего чанка, duration - длина всего аудио
+ChunkTranscript = namedtuple('ChunkTranscript', ['digest', 'segments', 'overlap', 'duration'])
+
+
+def chunk_digest(chunk_data):
+    """Хеш содержимого чанка"""
+    return hashlib.sha1(chunk_data).hexdigest()
+
+
+def segments_from_verbose(result, duration):
+    """Разбирает ответ Whisper в формате verbose_json на сегменты со словами"""
+    segments = [[seg.start, seg.end, seg.text, []] for seg in (result.segments or [])]
+    if not segments and result.text:
+        segments = [[0.0, duration, result.text, []]]
+    for word in result.words or []:
+        # Слово относим к последнему сегменту, начавшемуся не позже слова
+        target = segments[0] if segments else None
+        for seg in segments:
+            if seg[0] <= word.start:
+                target = seg
+        if target is not None:
+            target[3].append((word.start, word.end, word.word))
+    return [tuple(seg) for seg in segments]
+
+
+class TranscriptCache:
+    """Кеш расшифровок по чанкам: каждый чанк распознается один раз"""
+
+    def __init__(self):
+        self.entries = {}  # (chat_id, номер чанка) -> ChunkTranscript
+        self.processed = {}  # chat_id -> последнее обработанное окно чанков
+
+    def get(self, chat_id, chunk_num, digest):
+        """Возвращает расшифровку чанка, если его содержимое не изменилось"""
+        entry = self.entries.get((chat_id, chunk_num))
+        if entry is not None and entry.digest == digest:
+            return entry
+        return None
+
+    def put(self, chat_id, chunk_num, entry):
+        self.entries[(chat_id, chunk_num)] = entry
+
+    def assemble(self, chat_id, chunk_nums):
+        """Склеивает расшифровки окна чанков по временным меткам слов без дублей на стыках"""
+        parts = []
+        for i, chunk_num in enumerate(chunk_nums):
+            entry = self.entries.get((chat_id, chunk_num))
+            if entry is None:
+                continue
+            # Начало: слова из хвоста предыдущего чанка уже есть в его расшифровке
+            lower = entry.overlap - EDGE_SECONDS if entry.overlap else float('-inf')
+            # Конец: слово на стыке целиком попадет в расшифровку следующего чанка
+            upper = float('inf')
+            if i + 1 < len(chunk_nums):
+                next_entry = self.entries.get((chat_id, chunk_nums[i + 1]))
+                if next_entry is not None and next_entry.overlap:
+                    upper = entry.duration - EDGE_SECONDS
+
+            for seg_start, seg_end, seg_text, words in entry.segments:
+                if not words:
+                    # Без пословных меток решаем по сегменту целиком
+                    if lower <= seg_end < upper:
+                        parts.append(seg_text.strip())
+                    continue
+                kept = [word for start, end, word in words if lower <= end < upper]
+                if len(kept) == len(words):
+                    parts.append(seg_text.strip())  # Сегмент целиком - сохраняем пунктуацию
+                elif kept:
+                    parts.append(" ".join(word.strip() for word in kept))
+        return " ".join(part for part in parts if part)
+
+    def is_processed(self, chat_id, chunk_nums):
+        """Проверяет, что это окно уже обрабатывалось"""
+        return self.processed.get(chat_id) == list(chunk_nums)
+
+    def mark_processed(self, chat_id, chunk_nums):
+        self.processed[chat_id] = list(chunk_nums)
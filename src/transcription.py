@@ -0,0 +1,200 @@
+import io
+import os
+import time
+import threading
+import importlib.util
+import multiprocessing
+from types import SimpleNamespace
+
+from clients import get_openai_client
+from tracing import span
+
+LANGUAGE = "ru"  # Язык распознавания
+LOCAL_MODEL = "small"  # Модель faster-whisper: "tiny", "base", "small", "medium", "large-v3" или путь
+LOCAL_COMPUTE_TYPE = "int8"  # Квантование весов для CPU
+LOCAL_THREADS = 4  # Потоков CPU для локальной модели
+LOCAL_BEAM_SIZE = 1  # Жадный поиск: на коротких чанках почти не хуже, но заметно быстрее
+LOCAL_TIMEOUT = 120.0  # Сколько ждать ответа от процесса с моделью (секунды)
+
+
+class TranscriptionEngine:
+    """Движок распознавания речи.
+
+    transcribe() принимает путь к файлу или кортеж (имя, байты) и возвращает результат
+    в формате verbose_json Whisper (text, duration, segments, words) или None при ошибке.
+    После каждого вызова last_rtf - real-time factor: время распознавания / длительность аудио.
+    """
+    name = None
+    upload_format = None  # Предпочтительный формат загрузки (None - любой)
+
+    def __init__(self):
+        self.last_seconds = None
+        self.last_rtf = None
+
+    def warm_up(self):
+        """Готовит движок к первому вызову в фоновом потоке"""
+        return None
+
+    def _transcribe(self, filename, data):
+        raise NotImplementedError
+
+    def transcribe(self, audio_file, duration=None):
+        """duration - длительность аудио в секундах для расчета RTF"""
+        try:
+            if isinstance(audio_file, str):
+                with open(audio_file, "rb") as f:
+                    audio_file = (os.path.basename(audio_file), f.read())
+            with span(f"whisper.{self.name}", bytes=len(audio_file[1])) as s:
+                start = time.perf_counter()
+                result = self._transcribe(*audio_file)
+                self.last_seconds = time.perf_counter() - start
+                duration = duration or getattr(result, "duration", None)
+                self.last_rtf = self.last_seconds / duration if duration else None
+                s.set(audio_seconds=duration, rtf=self.last_rtf)
+        except Exception as e:
+            print(f"Ошибка при распознавании речи ({self.name}): {str(e)}")
+            return None
+        return result
+
+    def stop(self):
+        pass
+
+
+class OpenAIEngine(TranscriptionEngine):
+    """Whisper через OpenAI API"""
+    name = "openai"
+
+    def _transcribe(self, filename, data):
+        return get_openai_client().audio.transcriptions.create(
+            model="whisper-1",
+            file=(filename, data),
+            language=LANGUAGE,
+            response_format="verbose_json",
+            timestamp_granularities=["word", "segment"]
+        )
+
+
+def _local_worker(conn, model_name, compute_type, threads, beam_size, language):
+    """Процесс с локальной моделью: загружает ее один раз и распознает присланные файлы"""
+    try:
+        from faster_whisper import WhisperModel
+        import numpy as np
+
+        start = time.perf_counter()
+        model = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=threads)
+        # Прогон на секунде тишины: выделяет буферы, чтобы первый чанк не был медленнее остальных
+        list(model.transcribe(np.zeros(16000, dtype=np.float32), language=language, beam_size=beam_size)[0])
+        conn.send(("ready", time.perf_counter() - start))
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        try:
+            segments, info = model.transcribe(io.BytesIO(request), language=language, beam_size=beam_size,
+                                              word_timestamps=True)
+            result = {"text": "", "duration": info.duration, "segments": [], "words": []}
+            for segment in segments:
+                result["segments"].append({"start": segment.start, "end": segment.end, "text": segment.text})
+                result["words"].extend({"start": word.start, "end": word.end, "word": word.word}
+                                       for word in segment.words or [])
+            result["text"] = "".join(segment["text"] for segment in result["segments"]).strip()
+            conn.send(("ok", result))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class LocalEngine(TranscriptionEngine):
+    """Whisper на CPU через faster-whisper (CTranslate2).
+
+    Модель живет в отдельном процессе: загружается один раз, не держит GIL
+    интерфейса и не роняет приложение, если упадет сама.
+    """
+    name = "local"
+    upload_format = "wav"  # Сжимать для соседнего процесса незачем
+
+    def __init__(self, model=LOCAL_MODEL, compute_type=LOCAL_COMPUTE_TYPE, threads=LOCAL_THREADS,
+                 beam_size=LOCAL_BEAM_SIZE):
+        super().__init__()
+        self.args = (model, compute_type, threads, beam_size, LANGUAGE)
+        self.process = None
+        self.conn = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def available():
+        return importlib.util.find_spec("faster_whisper") is not None
+
+    def _start(self):
+        """Запускает процесс с моделью и ждет ее загрузки"""
+        if self.process is not None and self.process.is_alive():
+            return
+        context = multiprocessing.get_context("spawn")
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_local_worker, args=(child_conn, *self.args), daemon=True)
+        self.process.start()
+        status, value = self.conn.recv()
+        if status != "ready":
+            self.process = None
+            raise RuntimeError(f"не удалось загрузить модель {self.args[0]}: {value}")
+        print(f"Локальная модель {self.args[0]} загружена за {value:.1f} с")
+
+    def warm_up(self):
+        def run():
+            try:
+                with self.lock:
+                    self._start()
+            except Exception as e:
+                print(f"Ошибка при загрузке локальной модели: {str(e)}")
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def _transcribe(self, filename, data):
+        with self.lock:
+            self._start()
+            self.conn.send(bytes(data))
+            if not self.conn.poll(LOCAL_TIMEOUT):
+                # Процесс с моделью перезапустится при следующем вызове
+                self.process.kill()
+                self.process.join()
+                self.process = None
+                raise TimeoutError(f"локальная модель не ответила за {LOCAL_TIMEOUT:.0f} с")
+            status, value = self.conn.recv()
+        if status != "ok":
+            raise RuntimeError(value)
+        return SimpleNamespace(
+            text=value["text"],
+            duration=value["duration"],
+            segments=[SimpleNamespace(**segment) for segment in value["segments"]],
+            words=[SimpleNamespace(**word) for word in value["words"]]
+        )
+
+    def stop(self):
+        if self.process is not None and self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self.process.join(timeout=1)
+            if self.process.is_alive():
+                self.process.kill()
+        self.process = None
+
+
+ENGINES = {engine.name: engine for engine in (OpenAIEngine, LocalEngine)}
+
+
+def create_engine(name):
+    """Создает движок распознавания. Если локальный недоступен, возвращает OpenAI"""
+    if name == "local" and not LocalEngine.available():
+        print("faster-whisper не установлен, распознавание через OpenAI")
+        name = "openai"
+    return ENGINES[name]()
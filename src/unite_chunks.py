@@ -1,5 +1,4 @@
 import os
-import wave
 
 from functions import unite_chunks, count_chunks
 
@@ -7,8 +6,9 @@ chat_id = 1
 
 N = count_chunks(chat_id)
 
-# unite_chunks(1, N-5, N, "temp/combined.wav")
+os.makedirs("temp", exist_ok=True)
 
-unite_chunks(1, 1, 1, "temp/combined.wav", to_print=True)
+# Последние 5 чанков чата
+print(unite_chunks(chat_id, N-5, N, "temp/combined.wav"))
 
 # command to run: python src/unite_chunks.py
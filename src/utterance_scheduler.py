@@ -0,0 +1,81 @@
+import math
+import time
+from collections import namedtuple
+
+from audio_recorder import SILENCE_LEVEL
+
+CHUNK_PAUSE = 0.3  # Пауза, на которой закрывается чанк (секунды, от спада огибающей ниже порога)
+UTTERANCE_PAUSE = 0.8  # Пауза, после которой реплика считается законченной (секунды)
+MIN_CHUNK_SECONDS = 2.0  # Чанк короче не закрываем на паузе
+MAX_CHUNK_SECONDS = 15.0  # Чанк длиннее закрываем, даже если пауз нет
+MIN_PROCESS_INTERVAL = 1.0  # Обработка запускается не чаще (секунды)
+MAX_PROCESS_INTERVAL = 20.0  # В длинном монологе обработка запускается хотя бы так часто (секунды)
+NOISE_RATIO = 3.0  # Речь - огибающая выше уровня шума во столько раз
+NOISE_RISE = 10.0  # Постоянная времени роста оценки шума (секунды); спадает она мгновенно
+
+# Граница, на которой нужно закрыть чанк. has_speech - была ли в чанке речь,
+# end_of_utterance - пора запускать обработку, speech_end - время (time.monotonic) последнего звука речи
+Boundary = namedtuple('Boundary', ['has_speech', 'end_of_utterance', 'reason', 'speech_end'])
+
+
+class UtteranceScheduler:
+    """Решает по огибающей звука, когда закрыть чанк и когда запустить обработку.
+
+    Чанк закрывается на паузе в речи, а не посреди слова; обработка запускается,
+    когда собеседник замолчал. Минимальные и максимальные интервалы страхуют
+    от слишком частых запусков и от бесконечного монолога.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self, now=None):
+        now = time.monotonic() if now is None else now
+        self.chunk_start = now
+        self.last_process = now
+        self.last_voice = None  # Когда последний раз слышали речь
+        self.last_update = now
+        self.voiced = False  # Есть ли речь в текущем чанке
+        self.utterance_open = False  # Была ли речь после последнего запуска обработки
+        self.noise_floor = None
+
+    def is_speech(self, envelope, dt):
+        """Сравнивает огибающую с адаптивным уровнем шума"""
+        if self.noise_floor is None or envelope < self.noise_floor:
+            self.noise_floor = envelope
+        else:
+            self.noise_floor += (1 - math.exp(-dt / NOISE_RISE)) * (envelope - self.noise_floor)
+        return envelope > max(SILENCE_LEVEL, self.noise_floor * NOISE_RATIO)
+
+    def update(self, level, now=None):
+        """Принимает снимок уровня (AudioLevel), возвращает Boundary или None"""
+        now = time.monotonic() if now is None else now
+        dt = max(now - self.last_update, 0.0)
+        self.last_update = now
+
+        if self.is_speech(level.envelope, dt):
+            self.last_voice = now
+            self.voiced = True
+            self.utterance_open = True
+
+        chunk_age = now - self.chunk_start
+        pause = now - self.last_voice if self.last_voice is not None else chunk_age
+        since_process = now - self.last_process
+
+        if self.utterance_open and pause >= UTTERANCE_PAUSE and since_process >= MIN_PROCESS_INTERVAL:
+            return self._close(now, True, "конец реплики")
+        if self.voiced and pause >= CHUNK_PAUSE and chunk_age >= MIN_CHUNK_SECONDS:
+            return self._close(now, self.utterance_open and since_process >= MAX_PROCESS_INTERVAL, "пауза")
+        if chunk_age >= MAX_CHUNK_SECONDS:
+            return self._close(now, self.utterance_open and since_process >= MAX_PROCESS_INTERVAL,
+                               "максимальная длина")
+        return None
+
+    def _close(self, now, end_of_utterance, reason):
+        boundary = Boundary(self.voiced, end_of_utterance, reason, self.last_voice)
+        self.chunk_start = now
+        self.voiced = False
+        if end_of_utterance:
+            self.last_process = now
+            self.utterance_open = False
+        return boundary
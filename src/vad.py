@@ -0,0 +1,74 @@
+import numpy as np
+from collections import namedtuple
+
+FRAME_MS = 30  # Длина кадра анализа (мс)
+MIN_ENERGY = 0.003  # Абсолютный минимум RMS кадра с речью
+MAX_THRESHOLD = 0.02  # Порог энергии не поднимается выше этого значения
+NOISE_RATIO = 3.0  # Во сколько раз речь громче шумового фона
+ZCR_SPEECH = 0.25  # Доля пересечений нуля, типичная для глухих согласных
+HANGOVER_MS = 200  # Сколько держать речь после последнего громкого кадра
+MIN_SPEECH_MS = 90  # Короче этого - щелчок, а не речь
+MAX_PAUSE = 1.0  # Паузы длиннее этого (секунд) сокращаются при обрезке тишины
+
+# ratio - доля кадров с речью, spans - список (начало, конец) в сэмплах
+SpeechInfo = namedtuple('SpeechInfo', ['ratio', 'spans'])
+
+
+def _runs(mask):
+    """Возвращает список (начало, конец) непрерывных участков True"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return list(zip(starts, ends))
+
+
+def detect_speech(samples, sample_rate, frame_ms=FRAME_MS):
+    """Находит участки речи по энергии и частоте пересечений нуля"""
+    frame_len = int(sample_rate * frame_ms / 1000)
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return SpeechInfo(0.0, [])
+
+    frames = samples[:n_frames * frame_len].astype(np.float32).reshape(n_frames, frame_len) / 32768
+    energy = np.sqrt(np.mean(frames ** 2, axis=1))
+    zcr = np.mean(np.abs(np.diff(np.signbit(frames).astype(np.int8), axis=1)), axis=1)
+
+    # Порог адаптируется к шумовому фону записи
+    noise_floor = float(np.percentile(energy, 10))
+    threshold = min(max(noise_floor * NOISE_RATIO, MIN_ENERGY), MAX_THRESHOLD)
+    speech = energy > threshold
+    # Шипящие и глухие согласные тише гласных, но много пересекают ноль
+    speech |= (energy > threshold / 2) & (zcr > ZCR_SPEECH)
+
+    # Убираем короткие щелчки
+    min_frames = max(int(MIN_SPEECH_MS / frame_ms), 1)
+    for start, end in _runs(speech):
+        if end - start < min_frames:
+            speech[start:end] = False
+
+    # Продлеваем речь на hangover, чтобы не резать окончания слов
+    hangover = int(HANGOVER_MS / frame_ms)
+    if hangover and speech.any():
+        speech = np.convolve(speech.astype(np.float32), np.ones(hangover + 1), mode='full')[:n_frames] > 0
+
+    spans = [(int(start * frame_len), int(min(end * frame_len, len(samples))))
+             for start, end in _runs(speech)]
+    return SpeechInfo(float(speech.mean()), spans)
+
+
+def trim_silence(samples, sample_rate, spans, max_pause=MAX_PAUSE):
+    """Сокращает паузы длиннее max_pause, оставляя по краям речи по половине max_pause"""
+    if not spans:
+        return samples[:0]
+    pad = int(sample_rate * max_pause / 2)
+    pieces = []
+    prev_end = 0
+    for start, end in spans:
+        keep_from = max(start - pad, prev_end)
+        if pieces and keep_from > prev_end:
+            # Пауза между участками длиннее max_pause: оставляем хвост предыдущего
+            pieces.append(samples[prev_end:min(prev_end + pad, keep_from)])
+        pieces.append(samples[keep_from:end])
+        prev_end = end
+    pieces.append(samples[prev_end:min(prev_end + pad, len(samples))])
+    return np.concatenate(pieces)
@@ -1,44 +1,80 @@
 from PyQt6.QtWidgets import QWidget
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QLineF
 from PyQt6.QtGui import QPainter, QColor, QPen
-from collections import deque
+import numpy as np
+
+try:
+    from PyQt6.sip import array as sip_array
+except ImportError:  # Старые PyQt6 без sip.array: отрезки собираются списком
+    sip_array = None
+
+HISTORY = 200  # Сколько последних уровней показывается
+GAIN = 15  # Масштаб уровня по высоте виджета
 
 class WaveVisualizer(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.levels = deque([0] * 200, maxlen=200)
-        
+        self.levels = np.zeros(HISTORY)
+        self.lines = None  # Буфер отрезков для drawLines, переиспользуется между перерисовками
+        self.drawn = None  # Высоты отрезков в пикселях на последней отрисовке
+
     def update_level(self, level):
-        """Обновляет уровень звука"""
-        self.levels.append(level)
-        self.update()
-        
+        """Обновляет уровень звука (число или снимок AudioLevel). Перерисовка запрашивается,
+        только если высота хотя бы одного отрезка изменилась на пиксель и больше"""
+        value = float(getattr(level, 'envelope', level))
+        if value == 0 and self.is_idle():
+            return
+        self.levels[:-1] = self.levels[1:]
+        self.levels[-1] = value
+        if self.drawn is None or not np.array_equal(self._pixels(), self.drawn):
+            self.update()
+
+    def _pixels(self):
+        """Высоты отрезков волны, округленные до пикселя"""
+        return np.rint(self.levels * (self.height() * GAIN))
+
+    def is_idle(self):
+        """Волна пустая: все уровни нулевые"""
+        return not self.levels.any()
+
     def clear(self):
         """Очищает буфер уровней звука"""
-        self.levels.clear()
-        self.levels.extend([0] * 200)
+        self.levels[:] = 0
         self.update()
-        
+
+    def _line_buffer(self):
+        """Отрезки волны как массив (n, 4): x1, y1, x2, y2. Для sip.array - без копирования в Qt"""
+        if sip_array is None:
+            return np.empty((len(self.levels), 4))
+        if self.lines is None or len(self.lines) != len(self.levels):
+            self.lines = sip_array(QLineF, len(self.levels))
+        return np.frombuffer(self.lines, dtype=np.float64).reshape(-1, 4)
+
     def paintEvent(self, event):
         painter = QPainter(self)
         width = self.width()
         height = self.height()
         center_y = height / 2
-        
-        # Рисуем волну
+
+        # Рисуем волну: вертикальный отрезок на каждый уровень, геометрия - одним проходом NumPy
         pen = painter.pen()
         pen.setColor(QColor(0, 150, 255))
         pen.setWidth(1)
         painter.setPen(pen)
-        
-        step = width / len(self.levels)
-        for i, level in enumerate(self.levels):
-            x = i * step
-            y = center_y - level * height * 15
-            painter.drawLine(int(x), int(center_y), int(x), int(y))
-            y = center_y + level * height * 15
-            painter.drawLine(int(x), int(center_y), int(x), int(y))
-            
+
+        x = np.arange(len(self.levels)) * (width / len(self.levels))
+        amplitude = self.levels * (height * GAIN)
+        self.drawn = np.rint(amplitude)
+        geometry = self._line_buffer()
+        geometry[:, 0] = x
+        geometry[:, 1] = center_y - amplitude
+        geometry[:, 2] = x
+        geometry[:, 3] = center_y + amplitude
+        if sip_array is None:
+            painter.drawLines([QLineF(*line) for line in geometry.tolist()])
+        else:
+            painter.drawLines(self.lines)
+
         # Центральная линия
         painter.setPen(QPen(QColor(100, 100, 100), 1, Qt.PenStyle.DotLine))
-        painter.drawLine(0, int(center_y), width, int(center_y)) 
\ No newline at end of file
+        painter.drawLine(0, int(center_y), width, int(center_y))